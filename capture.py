@@ -0,0 +1,125 @@
+"""
+Compact binary log of listener stream traffic, for replaying real traffic shapes.
+
+A capture is a sequence of records, each starting with a 1-byte type:
+
+    LISTENER  idx u16, name_len u16, name            listener_id of connection idx
+    PAYLOAD   pid u32, length u32, bytes             payload stored once, by content
+    OPEN      idx u16, t f64                         listener opened a stream POST
+    FRAME     idx u16, t f64, seq u32, pid u32       frame `seq` carrying payload `pid`
+    CLOSE     idx u16, t f64                         stream POST ended
+
+`idx` identifies one stream POST, not a listener: two POSTs with the same
+listener_id can overlap (a reconnect that arrives before the old connection
+is torn down, or two load boxes using the same ids). Every OPEN is preceded
+by the LISTENER record of its index, and an index is reused only after its
+CLOSE. `t` is seconds since the capture started. Frames refer to payloads by
+id and identical payloads are stored once, so listeners looping the same WAV
+cost a few bytes per frame after the first pass.
+"""
+import hashlib, mmap, struct
+from collections import namedtuple
+from pathlib import Path
+
+MAGIC = b"MLCAP1\n"
+R_LISTENER, R_PAYLOAD, R_OPEN, R_FRAME, R_CLOSE = range(5)
+
+_LISTENER = struct.Struct("<BHH")
+_PAYLOAD = struct.Struct("<BII")
+_EVENT = struct.Struct("<BHd")          # OPEN / CLOSE
+_FRAME = struct.Struct("<BHdII")
+
+# one stream POST of one listener; frames are (t, seq, payload memoryview)
+Session = namedtuple("Session", "listener_id start end frames")
+
+
+class CaptureWriter:
+    """Append stream events to a capture file (buffered; call close() to flush)."""
+
+    def __init__(self, path: str | Path, clock):
+        self.fh = open(path, "wb")
+        self.fh.write(MAGIC)
+        self.clock = clock
+        self.t0 = clock()
+        self.free: list[int] = []       # indices of closed stream POSTs
+        self.next_idx = 0
+        self.payloads: dict[bytes, int] = {}
+
+    def _now(self) -> float:
+        return self.clock() - self.t0
+
+    def open(self, listener_id: str) -> int:
+        """Record a new stream POST; returns its index for frame()/close_stream()."""
+        if self.free:
+            idx = self.free.pop()
+        elif self.next_idx <= 0xFFFF:
+            idx, self.next_idx = self.next_idx, self.next_idx + 1
+        else:
+            raise ValueError("capture: more than 65536 stream POSTs open at once")
+        name = listener_id.encode()
+        self.fh.write(_LISTENER.pack(R_LISTENER, idx, len(name)) + name)
+        self.fh.write(_EVENT.pack(R_OPEN, idx, self._now()))
+        return idx
+
+    def frame(self, idx: int, seq: int, payload):
+        key = hashlib.blake2b(payload, digest_size=16).digest()
+        pid = self.payloads.get(key)
+        if pid is None:
+            pid = self.payloads[key] = len(self.payloads)
+            self.fh.write(_PAYLOAD.pack(R_PAYLOAD, pid, len(payload)))
+            self.fh.write(payload)
+        self.fh.write(_FRAME.pack(R_FRAME, idx, self._now(), seq, pid))
+
+    def close_stream(self, idx: int):
+        self.fh.write(_EVENT.pack(R_CLOSE, idx, self._now()))
+        self.free.append(idx)
+
+    def close(self):
+        self.fh.close()
+
+
+def read_capture(path: str | Path) -> list[Session]:
+    """
+    Parse a capture into sessions ordered by start time. Payloads are
+    memoryviews into a read-only mmap of the file, so nothing is copied.
+    """
+    with open(path, "rb") as fh:
+        view = memoryview(mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ))
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{path} is not a listener capture")
+
+    names: dict[int, str] = {}
+    payloads: dict[int, memoryview] = {}
+    open_sessions: dict[int, Session] = {}
+    sessions: list[Session] = []
+    pos = len(MAGIC)
+    while pos < len(view):
+        kind = view[pos]
+        if kind == R_LISTENER:
+            _, idx, n = _LISTENER.unpack_from(view, pos)
+            pos += _LISTENER.size
+            names[idx] = bytes(view[pos:pos + n]).decode()
+            pos += n
+        elif kind == R_PAYLOAD:
+            _, pid, n = _PAYLOAD.unpack_from(view, pos)
+            pos += _PAYLOAD.size
+            payloads[pid] = view[pos:pos + n]
+            pos += n
+        elif kind == R_FRAME:
+            _, idx, t, seq, pid = _FRAME.unpack_from(view, pos)
+            pos += _FRAME.size
+            open_sessions[idx].frames.append((t, seq, payloads[pid]))
+        elif kind in (R_OPEN, R_CLOSE):
+            _, idx, t = _EVENT.unpack_from(view, pos)
+            pos += _EVENT.size
+            if idx in open_sessions:        # CLOSE, or an OPEN whose CLOSE never made it
+                sessions.append(open_sessions.pop(idx)._replace(end=t))
+            if kind == R_OPEN:
+                open_sessions[idx] = Session(names[idx], t, None, [])
+        else:
+            raise ValueError(f"{path}: unknown record type {kind} at offset {pos}")
+    # streams still open when the capture stopped end at their last frame
+    for s in open_sessions.values():
+        sessions.append(s._replace(end=s.frames[-1][0] if s.frames else s.start))
+    sessions.sort(key=lambda s: s.start)
+    return sessions
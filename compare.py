@@ -0,0 +1,253 @@
+"""
+Compare saved stress-test runs, e.g. before and after an aggregator change.
+
+A run is a report (`--report-out`, JSON) or a metrics stream (`--metrics-out`,
+JSON lines or CSV). Give each side several repeated runs to get confidence
+intervals:
+
+    python compare.py -b before_*.json -c after_*.json
+    python compare.py -b base_*.jsonl -c build_a_*.jsonl -c build_b_*.jsonl --threshold 3
+
+Every run is reduced to one value per metric: report totals and latency
+percentiles as they are, or the per-interval rows of a metrics stream averaged
+(after `--skip` seconds of warm-up). Metrics that every run has are compared
+by their mean over the runs. With at least two runs on each side, the change
+gets a 95 % Welch t confidence interval; with repeats on one side only, the
+single run is assumed to be as noisy as those. A change is a regression when
+it moves the wrong way by more than `--threshold` percent and its interval
+excludes zero. With a single run on each side there is no interval, so
+changes beyond the threshold are only marked "unverified". The exit status is
+1 if any regression is flagged.
+"""
+import argparse, csv, json, math, re, statistics, sys
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+# two-sided 95 % Student t critical values for 1..30 degrees of freedom; normal beyond
+T95 = (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+       2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+       2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042)
+LATENCY_KEYS = ("p50_ms", "p90_ms", "p99_ms")
+# settings that don't change what was measured
+IGNORED_SETTINGS = {"report_out", "metrics_out", "metrics_format", "metrics_interval", "headless"}
+
+
+def direction(metric: str) -> int:
+    """+1 if higher is better, -1 if lower is better, 0 if the metric isn't compared."""
+    if metric.endswith("_per_s") or metric == "rt_ratio":
+        return 1
+    if metric.endswith("_ms") or metric in ("errors_per_min", "error_pct"):
+        return -1
+    return 0
+
+
+def report_metrics(report: dict) -> dict[str, float]:
+    totals, elapsed = report["totals"], report["elapsed_s"]
+    out = {key: value for key, value in totals.items()
+           if direction(key) and isinstance(value, (int, float))}
+    if elapsed:
+        out["errors_per_min"] = totals["errors"] / elapsed * 60
+    if totals.get("uploads"):
+        out["error_pct"] = totals["errors"] / totals["uploads"] * 100
+    for name, s in report["latency"].items():
+        if s["count"]:
+            out.update({f"{name}_{key}": s[key] for key in LATENCY_KEYS})
+    return out
+
+
+def stream_metrics(rows: list[dict], skip: float) -> dict[str, float]:
+    """Average the interval rows of a metrics stream; latency only over intervals that had samples."""
+    # ramp/sweep step rows have no elapsed_s (in older CSVs: a blank one)
+    rows = [row for row in rows
+            if isinstance(row, dict) and isinstance(row.get("elapsed_s"), (int, float))]
+    kept = [row for row in rows if row["elapsed_s"] > skip] or rows[-1:]
+    if not kept:
+        return {}
+    sums: dict[str, list[float]] = {}
+    for row in kept:
+        for key, value in row.items():
+            if not direction(key) or not isinstance(value, (int, float)):
+                continue
+            m = re.match(r"(.+)_(p\d+_ms|p99_9_ms|mean_ms|max_ms)$", key)
+            if m and f"{m.group(1)}_count" in row:
+                # a histogram summary: p50/p90/p99, from intervals that had samples
+                if m.group(2) not in LATENCY_KEYS or not row[f"{m.group(1)}_count"]:
+                    continue
+            sums.setdefault(key, []).append(value)
+    out = {key: statistics.fmean(values) for key, values in sums.items()}
+    # errors is a running total: rate over the kept span
+    before = rows[rows.index(kept[0]) - 1] if rows.index(kept[0]) else {"errors": 0, "elapsed_s": 0.0}
+    span = kept[-1]["elapsed_s"] - before["elapsed_s"]
+    if "errors" in kept[-1] and span > 0:
+        out["errors_per_min"] = (kept[-1]["errors"] - before["errors"]) / span * 60
+    return out
+
+
+def _number(text: str):
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def load_run(path: str, skip: float) -> tuple[str, dict[str, float], dict]:
+    """(script or "metrics", metrics, settings) for one saved run."""
+    p = Path(path)
+    text = p.read_text()
+    if p.suffix.lower() == ".csv":
+        rows = [{key: _number(value) for key, value in row.items()}
+                for row in csv.DictReader(text.splitlines())]
+        return "metrics", stream_metrics(rows, skip), {}
+    try:
+        report = json.loads(text)
+    except json.JSONDecodeError:
+        report = None       # several JSON documents: a JSON lines metrics stream
+    if isinstance(report, dict) and "totals" in report:
+        return report["script"], report_metrics(report), report.get("settings", {})
+    rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+    return "metrics", stream_metrics(rows, skip), {}
+
+
+def mean_ci(values: list[float]) -> tuple[float, float | None]:
+    """Mean and 95 % CI half-width (None for a single run)."""
+    mean = statistics.fmean(values)
+    if len(values) < 2:
+        return mean, None
+    return mean, _t95(len(values) - 1) * statistics.stdev(values) / math.sqrt(len(values))
+
+
+def _t95(df: float) -> float:
+    df = max(1, int(df))        # rounding down keeps the interval conservative
+    return T95[df - 1] if df <= len(T95) else 1.96
+
+
+def welch(base: list[float], cand: list[float]) -> float | None:
+    """
+    95 % CI half-width of mean(cand) - mean(base) (Welch). If only one side
+    has repeats, the single run is assumed to vary as much as they do; None
+    if neither side has.
+    """
+    if len(base) < 2 and len(cand) < 2:
+        return None
+    if len(base) < 2 or len(cand) < 2:
+        repeated = base if len(base) > 1 else cand
+        var = statistics.variance(repeated)
+        return _t95(len(repeated) - 1) * math.sqrt(var / len(base) + var / len(cand))
+    vb, vc = statistics.variance(base) / len(base), statistics.variance(cand) / len(cand)
+    if vb + vc == 0:
+        return 0.0
+    df = (vb + vc) ** 2 / (vb ** 2 / (len(base) - 1) + vc ** 2 / (len(cand) - 1))
+    return _t95(df) * math.sqrt(vb + vc)
+
+
+def compare(base: list[dict], cand: list[dict], threshold: float, only: str | None) -> list[dict]:
+    """One row per metric that every run of both sides has."""
+    common = set.intersection(*(set(run) for run in base + cand))
+    rows = []
+    for metric in sorted(common):
+        if only and not re.search(only, metric):
+            continue
+        b = [run[metric] for run in base]
+        c = [run[metric] for run in cand]
+        b_mean, b_ci = mean_ci(b)
+        c_mean, c_ci = mean_ci(c)
+        diff, diff_ci = c_mean - b_mean, welch(b, c)
+        pct = diff / abs(b_mean) * 100 if b_mean else (0.0 if not diff else math.inf)
+        pct_ci = diff_ci / abs(b_mean) * 100 if diff_ci is not None and b_mean else None
+        worse = pct * direction(metric) < -threshold
+        better = pct * direction(metric) > threshold
+        if not (worse or better):
+            verdict = ""
+        elif diff_ci is None:
+            verdict = "unverified (no repeats)"     # one run each: no idea how noisy it is
+        elif abs(diff) <= diff_ci:
+            verdict = "within noise"
+        else:
+            verdict = "REGRESSION" if worse else "better"
+        rows.append({"metric": metric, "base": b_mean, "base_ci": b_ci, "cand": c_mean,
+                     "cand_ci": c_ci, "pct": pct, "pct_ci": pct_ci, "verdict": verdict})
+    return rows
+
+
+def setting_diffs(base: dict, cand: dict) -> list[str]:
+    keys = sorted((set(base) | set(cand)) - IGNORED_SETTINGS)
+    return [f"{key}: {base.get(key)} → {cand.get(key)}"
+            for key in keys if base.get(key) != cand.get(key)]
+
+
+def _num(value: float) -> str:
+    return f"{value:,.3f}" if abs(value) < 1000 else f"{value:,.0f}"
+
+
+def _fmt(value: float, ci: float | None) -> str:
+    return _num(value) + (f" ± {_num(ci)}" if ci is not None else "")
+
+
+def print_comparison(rows: list[dict], title: str, plain: bool):
+    cells = [(r["metric"], _fmt(r["base"], r["base_ci"]), _fmt(r["cand"], r["cand_ci"]),
+              f"{r['pct']:+.1f}%" + (f" ± {r['pct_ci']:.1f}" if r["pct_ci"] is not None else ""),
+              r["verdict"]) for r in rows]
+    if plain:
+        print(title)
+        for cell in cells:
+            print("  ".join(cell))
+        return
+    table = Table(title=title, show_header=True, header_style="bold magenta")
+    table.add_column("metric", no_wrap=True)
+    for col in ("baseline", "candidate", "change (95% CI)"):
+        table.add_column(col, justify="right")
+    table.add_column("", no_wrap=True)
+    for cell, r in zip(cells, rows):
+        style = "red" if r["verdict"] == "REGRESSION" else "green" if r["verdict"] == "better" else None
+        table.add_row(*cell, style=style)
+    Console().print(table)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare saved stress-test runs and flag regressions.")
+    ap.add_argument("-b", "--baseline", nargs="+", required=True, metavar="RUN",
+                    help="Baseline runs: reports (--report-out) or metrics streams (--metrics-out)")
+    ap.add_argument("-c", "--candidate", nargs="+", action="append", required=True, metavar="RUN",
+                    help="Candidate runs; repeat -c to compare several builds against the baseline")
+    ap.add_argument("--threshold", type=float, default=5.0,
+                    help="Percent change in the wrong direction that counts as a regression")
+    ap.add_argument("--skip", type=float, default=0.0,
+                    help="Metrics streams: ignore rows from the first N seconds (warm-up)")
+    ap.add_argument("--metric", default=None,
+                    help="Only compare metrics matching this regular expression")
+    ap.add_argument("--plain", action="store_true",
+                    help="Plain text instead of a table")
+    args = ap.parse_args()
+
+    try:
+        base = [load_run(path, args.skip) for path in args.baseline]
+        groups = [[load_run(path, args.skip) for path in paths] for paths in args.candidate]
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        sys.exit(f"cannot read run: {e}")
+    kinds = {kind for kind, _, _ in base + [run for group in groups for run in group]}
+    if len(kinds) > 1:
+        sys.exit(f"runs of different kinds can't be compared: {', '.join(sorted(kinds))}")
+
+    regressions = 0
+    for n, (paths, group) in enumerate(zip(args.candidate, groups), start=1):
+        rows = compare([m for _, m, _ in base], [m for _, m, _ in group], args.threshold, args.metric)
+        label = paths[0] if len(paths) == 1 else f"candidate {n} ({len(paths)} runs)"
+        title = f"{label} vs baseline ({len(base)} runs), threshold {args.threshold:g}%"
+        if not rows:
+            print(f"{title}: no metrics in common")
+            continue
+        print_comparison(rows, title, args.plain)
+        for line in setting_diffs(base[0][2], group[0][2]):
+            print(f"  setting differs: {line}")
+        if len(base) < 2 and len(group) < 2:
+            print("  one run per side: repeat runs for confidence intervals and regression checks")
+        regressions += sum(r["verdict"] == "REGRESSION" for r in rows)
+    if regressions:
+        print(f"{regressions} regression(s) beyond {args.threshold:g}%")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
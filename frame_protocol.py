@@ -0,0 +1,326 @@
+"""
+The listener → aggregator stream frame format, encoder and incremental decoder.
+
+Every frame is a 6-byte header followed by the payload:
+
+    seq     3 bytes, little endian
+    length  3 bytes, little endian (payload size, ≤ 0xFFFFFF)
+
+seq 0 carries the WAV header and starts a new file; PCM pages follow as
+1, 2, … and wrap from 0xFFFFFE back to 1. SEQ_META (0xFFFFFF) frames carry
+compact JSON metadata and sit outside the PCM sequence:
+
+    {"type": "tick", "t": <send time, epoch s>, "seq": …, "pages": …, "bytes": …, "lag_ms": …}
+    {"type": "file_end", "t": …, "pages": <pages in file>, "crc32": <CRC-32 of the file's PCM>}
+    {"type": "resume", "t": …, "page": <last page already delivered>}
+
+A stream that resumes a file after a reconnect re-sends the file's seq 0
+header frame, then a resume frame, then continues with page `page` + 1.
+
+Run as a script to decode a captured request body offline:
+
+    python frame_protocol.py capture.bin --out ./reassembled
+"""
+import argparse, json, struct, sys, time, zlib
+from collections import namedtuple
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterator
+
+HEADER_LEN = 6
+SEQ_HEADER = 0
+SEQ_META = 0xFFFFFF
+SEQ_MAX = 0xFFFFFE          # last PCM seq before wrapping to 1
+MAX_PAYLOAD = 0xFFFFFF
+HEADER_LIMIT = 64           # body parts shorter than this are held and sent with the next one
+
+Frame = namedtuple("Frame", "seq payload")
+
+
+def frame_header(seq: int, payload_len: int) -> bytes:
+    """Return the 6-byte frame header (3-byte seq + 3-byte length, little endian)."""
+    if payload_len > MAX_PAYLOAD:
+        raise ValueError(f"payload of {payload_len} bytes does not fit the 3-byte length field")
+    seq_bytes = struct.pack("<I", seq)[:3]  # 3 bytes for sequence
+    # Pack payload length as 3 bytes (little endian)
+    len_bytes = struct.pack("<I", payload_len)[:3]  # 3 bytes for length
+    return seq_bytes + len_bytes
+
+def make_frame(seq: int, payload: bytes) -> bytes:
+    """Return 6-byte frame header + payload."""
+    return frame_header(seq, len(payload)) + payload
+
+def meta_frame(info: dict) -> bytes:
+    """Encode a metadata frame (SEQ_META + compact JSON payload)."""
+    return make_frame(SEQ_META, json.dumps(info, separators=(",", ":")).encode())
+
+def parse_meta(payload) -> dict:
+    return json.loads(bytes(payload))
+
+def next_seq(seq: int) -> int:
+    """PCM seq that follows `seq` (wraps past SEQ_MAX to 1, skipping 0 and SEQ_META)."""
+    return 1 if seq >= SEQ_MAX else seq + 1
+
+def page_seq(page: int) -> int:
+    """Seq of the `page`-th PCM page of a file (1-based)."""
+    return (page - 1) % SEQ_MAX + 1
+
+async def frame_writes(body: AsyncIterator) -> AsyncIterator[tuple]:
+    """
+    Group a streamer body, which yields each frame header and its payload as
+    separate parts, into one tuple of buffers per transport write: a short part
+    (a header) is held and paired with the part after it.
+    """
+    held = None
+    async for part in body:
+        if held is not None:
+            yield held, part
+            held = None
+        elif len(part) < HEADER_LIMIT:
+            held = part
+        else:
+            yield (part,)
+    if held is not None:
+        yield (held,)
+
+
+class FrameDecoder:
+    """
+    Incremental decoder: feed it arbitrary chunks, get back complete frames.
+
+    Bytes live in one preallocated bytearray. Payloads are handed out as
+    memoryview slices of it, so nothing is copied after the bytes arrive; a
+    slice stays valid until the next call that adds data. Consumed space is
+    reclaimed by moving only the partial frame at the tail to the front.
+    `get_buffer()` / `buffer_updated()` match asyncio.BufferedProtocol, so a
+    socket can read straight into the decoder without an intermediate copy.
+
+    Sequence numbers are checked as they go by: `seq_errors` counts PCM
+    frames that don't follow their predecessor (drops, duplicates, reorders).
+    """
+
+    def __init__(self, capacity: int = 1 << 20):
+        self.buf = bytearray(capacity)
+        self.start = 0              # first undecoded byte
+        self.end = 0                # one past the last received byte
+        self.expect_seq = None      # next PCM seq, None until a header frame arrived
+        self.frames = 0
+        self.files = 0              # header frames seen
+        self.meta_frames = 0
+        self.seq_errors = 0
+        self.pcm_bytes = 0
+
+    # ── receiving ───────────────────────────────────────────────────────────
+    def get_buffer(self, sizehint: int = -1) -> memoryview:
+        """Writable space for at least `sizehint` more bytes (BufferedProtocol API)."""
+        need = max(sizehint, 1)
+        if len(self.buf) - self.end < need:
+            pending = self.end - self.start
+            if self.start and len(self.buf) - pending >= need:
+                # move the partial frame to the front
+                self.buf[:pending] = self.buf[self.start:self.end]
+            else:
+                # never resize in place: payload views handed out earlier may still exist
+                grown = bytearray(max(len(self.buf) * 2, pending + need))
+                grown[:pending] = self.buf[self.start:self.end]
+                self.buf = grown
+            self.start, self.end = 0, pending
+        return memoryview(self.buf)[self.end:]
+
+    def buffer_updated(self, nbytes: int):
+        self.end += nbytes
+
+    def feed(self, data: bytes):
+        """Copy `data` in (for sources that hand out their own bytes objects)."""
+        self.get_buffer(len(data))[:len(data)] = data
+        self.buffer_updated(len(data))
+
+    @property
+    def pending(self) -> int:
+        """Bytes of an incomplete frame still waiting for more data."""
+        return self.end - self.start
+
+    # ── decoding ────────────────────────────────────────────────────────────
+    def __iter__(self) -> Iterator[Frame]:
+        """Yield every complete frame received so far."""
+        buf, view = self.buf, memoryview(self.buf)
+        while self.end - self.start >= HEADER_LEN:
+            pos = self.start
+            seq = buf[pos] | buf[pos + 1] << 8 | buf[pos + 2] << 16
+            length = buf[pos + 3] | buf[pos + 4] << 8 | buf[pos + 5] << 16
+            if self.end - pos - HEADER_LEN < length:
+                break
+            self.start = pos + HEADER_LEN + length
+            self._check(seq, length)
+            yield Frame(seq, view[pos + HEADER_LEN:self.start])
+
+    def _check(self, seq: int, length: int):
+        self.frames += 1
+        if seq == SEQ_META:
+            self.meta_frames += 1
+        elif seq == SEQ_HEADER:
+            self.files += 1
+            self.expect_seq = 1
+        else:
+            if seq != self.expect_seq:
+                self.seq_errors += 1
+            self.expect_seq = next_seq(seq)
+            self.pcm_bytes += length
+
+    def resume(self, page: int):
+        """The stream continues its file after `page` (resume metadata frame)."""
+        self.expect_seq = page_seq(page + 1)
+
+
+class WavAssembler:
+    """
+    Rebuild the WAV files of one stream from its decoded frames.
+
+    Each header frame starts a new file; `on_file(index, wav_bytes)` is called
+    when a file is complete (next header frame, or close()). RIFF and data
+    sizes are patched to what actually arrived, so truncated files stay valid.
+    """
+
+    def __init__(self, on_file: Callable[[int, bytes], None]):
+        self.on_file = on_file
+        self.header = None
+        self.pcm = bytearray()
+        self.count = 0
+
+    def add(self, frame: Frame):
+        if frame.seq == SEQ_META:
+            return
+        if frame.seq == SEQ_HEADER:
+            self.close()
+            self.header = bytearray(frame.payload)
+        elif self.header is not None:
+            self.pcm += frame.payload
+
+    def close(self):
+        if self.header is None:
+            return
+        header = self.header
+        struct.pack_into("<I", header, len(header) - 4, len(self.pcm))            # data size
+        struct.pack_into("<I", header, 4, len(header) - 8 + len(self.pcm))        # RIFF size
+        self.on_file(self.count, bytes(header) + bytes(self.pcm))
+        self.count += 1
+        self.header = None
+        self.pcm = bytearray()
+
+
+class StreamVerifier:
+    """
+    Check decoded frames against the metadata the sender embeds.
+
+    file_end frames carry the page count and CRC-32 of the file just sent;
+    a page-count mismatch counts as dropped pages, a CRC mismatch as a
+    corrupt file. Every metadata frame carries its send time, which gives
+    one-way latency when sender and receiver share a clock (same host/NTP).
+
+    Keep one verifier per listener across connections to check resumed files:
+    a resume frame picks up the pages and CRC held from the interrupted
+    connection, and a gap between those and the resume point counts as
+    missing pages.
+    """
+
+    def __init__(self, on_latency: Callable[[float], None] | None = None):
+        self.on_latency = on_latency
+        self.crc = 0                # None once a gap makes the CRC uncheckable
+        self.pages = 0
+        self.in_file = False        # a file started and its file_end hasn't arrived
+        self.held = None            # (pages, crc) of the file a header frame interrupted
+        self.files_ok = 0
+        self.corrupt_files = 0
+        self.missing_pages = 0
+        self.resumes = 0
+
+    def add(self, frame: Frame) -> dict | None:
+        """Feed one frame; returns the decoded metadata for SEQ_META frames."""
+        if frame.seq == SEQ_HEADER:
+            self.held = (self.pages, self.crc) if self.in_file else None
+            self.crc, self.pages, self.in_file = 0, 0, True
+        elif frame.seq != SEQ_META:
+            if self.crc is not None:
+                self.crc = zlib.crc32(frame.payload, self.crc)
+            self.pages += 1
+        else:
+            meta = parse_meta(frame.payload)
+            if "t" in meta and self.on_latency:
+                self.on_latency(time.time() - meta["t"])
+            kind = meta.get("type")
+            if kind == "resume":
+                self.resumes += 1
+                page = meta["page"]
+                # nothing held (this receiver never saw the file's start): the gap is unknown
+                pages, crc = self.held or (page, None)
+                if pages != page:
+                    self.missing_pages += abs(page - pages)
+                    crc = None
+                self.pages, self.crc, self.held = page, crc, None
+            elif kind == "file_end":
+                self.in_file = False
+                if meta["pages"] != self.pages:
+                    self.missing_pages += abs(meta["pages"] - self.pages)
+                elif self.crc is None:
+                    pass            # resumed across a gap: already counted as missing
+                elif meta["crc32"] != self.crc:
+                    self.corrupt_files += 1
+                else:
+                    self.files_ok += 1
+            return meta
+        return None
+
+
+def write_wavs(out_dir: Path, prefix: str) -> Callable[[int, bytes], None]:
+    """`on_file` callback that writes `<prefix>_<index>.wav` files into `out_dir`."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    def on_file(index: int, wav: bytes):
+        (out_dir / f"{prefix}_{index:04d}.wav").write_bytes(wav)
+    return on_file
+
+
+def decode_file(path: Path, chunk_size: int = 64 * 1024,
+                assembler: WavAssembler | None = None,
+                verifier: StreamVerifier | None = None) -> FrameDecoder:
+    """Decode a captured stream body from disk; returns the decoder with its counters."""
+    decoder = FrameDecoder()
+    with open(path, "rb") as fh:
+        while True:
+            buf = decoder.get_buffer(chunk_size)
+            n = fh.readinto(buf[:chunk_size])
+            if not n:
+                break
+            decoder.buffer_updated(n)
+            for frame in decoder:
+                if assembler:
+                    assembler.add(frame)
+                if verifier:
+                    meta = verifier.add(frame)
+                    if meta and meta.get("type") == "resume":
+                        decoder.resume(meta["page"])
+    if assembler:
+        assembler.close()
+    return decoder
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Decode a captured /recordings_stream body.")
+    ap.add_argument("capture", help="File holding the raw (de-chunked) request body")
+    ap.add_argument("-o", "--out", default=None,
+                    help="Directory to write the reassembled WAV files to")
+    args = ap.parse_args()
+
+    capture = Path(args.capture)
+    assembler = WavAssembler(write_wavs(Path(args.out), capture.stem)) if args.out else None
+    ver = StreamVerifier()
+    dec = decode_file(capture, assembler=assembler, verifier=ver)
+    print(f"frames={dec.frames} files={dec.files} meta={dec.meta_frames} "
+          f"pcm_bytes={dec.pcm_bytes} seq_errors={dec.seq_errors} trailing_bytes={dec.pending} "
+          f"files_verified={ver.files_ok} corrupt_files={ver.corrupt_files} "
+          f"missing_pages={ver.missing_pages} resumes={ver.resumes}")
+    bad = dec.seq_errors or dec.pending or ver.corrupt_files or ver.missing_pages
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
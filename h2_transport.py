@@ -0,0 +1,276 @@
+"""
+HTTP/2 transport for `--transport h2`: listener streams are multiplexed over a
+few shared TCP connections instead of one connection per listener.
+
+Needs the optional `h2` package (pip install h2). http:// URLs use h2c with
+prior knowledge; https:// URLs negotiate "h2" via ALPN. Each connection carries
+up to the server's SETTINGS_MAX_CONCURRENT_STREAMS (or `max_streams`, if
+lower). When every connection is full, the pool opens another one.
+
+DATA frames respect both the stream and the connection flow-control windows.
+A body that runs out of window waits for the server's WINDOW_UPDATE instead
+of buffering, so the pacing can never outrun what the server grants. That
+wait shows up in the streamer's frame latency.
+
+`H2Session.post(url, data=...)` matches RawSession and aiohttp, so streamer()
+works unchanged.
+"""
+import asyncio, ssl
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+
+from frame_protocol import frame_writes
+
+try:
+    import h2.config, h2.connection, h2.events, h2.exceptions
+except ImportError:
+    h2 = None
+
+READ_SIZE = 1 << 16
+SETTINGS_TIMEOUT = 10.0     # seconds to wait for the server's first SETTINGS frame
+
+
+class _Stream:
+    def __init__(self):
+        self.headers = asyncio.get_running_loop().create_future()
+        self.body = bytearray()
+        self.ended = asyncio.Event()
+        self.window = asyncio.Event()       # set when the server grants more window
+        self.error: Exception | None = None
+
+    def fail(self, exc: Exception):
+        self.error = exc
+        if not self.headers.done():
+            self.headers.set_result(None)       # waiters check .error
+        self.ended.set()
+        self.window.set()
+
+
+class H2Connection:
+    """One TCP connection; a reader task dispatches h2 events to its streams."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, max_streams: int):
+        self.reader, self.writer = reader, writer
+        self.max_streams = max_streams
+        self.conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=True, header_encoding="utf-8"))
+        self.conn.initiate_connection()
+        self.streams: dict[int, _Stream] = {}
+        self.closed = False
+        self.settings = asyncio.Event()     # server's SETTINGS arrived (stream limit known)
+        self.flush()
+        self.reader_task = asyncio.create_task(self._read_loop())
+
+    @property
+    def free(self) -> int:
+        """Stream slots left on this connection."""
+        if self.closed:
+            return 0
+        limit = min(self.conn.remote_settings.max_concurrent_streams, self.max_streams)
+        return limit - len(self.streams)
+
+    def flush(self):
+        data = self.conn.data_to_send()
+        if data:
+            self.writer.write(data)
+
+    async def _read_loop(self):
+        error = ConnectionError("connection closed by server")
+        try:
+            while data := await self.reader.read(READ_SIZE):
+                for event in self.conn.receive_data(data):
+                    self._dispatch(event)
+                self.flush()
+        except (OSError, h2.exceptions.H2Error) as e:
+            error = ConnectionError(f"{type(e).__name__}: {e}")
+        finally:
+            self.closed = True
+            self.settings.set()
+            for st in self.streams.values():
+                st.fail(error)
+            self.writer.close()
+
+    def _dispatch(self, event):
+        st = self.streams.get(getattr(event, "stream_id", None))
+        if isinstance(event, h2.events.ResponseReceived) and st:
+            if not st.headers.done():
+                st.headers.set_result(dict(event.headers))
+        elif isinstance(event, h2.events.DataReceived):
+            if st:
+                st.body += event.data
+            # the body is consumed right away, so hand the window straight back
+            self.conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+        elif isinstance(event, h2.events.StreamEnded) and st:
+            st.ended.set()
+        elif isinstance(event, h2.events.StreamReset) and st:
+            st.fail(ConnectionError(f"stream reset by server ({event.error_code!r})"))
+        elif isinstance(event, (h2.events.WindowUpdated, h2.events.RemoteSettingsChanged)):
+            if isinstance(event, h2.events.RemoteSettingsChanged):
+                self.settings.set()
+            # stream 0 / new settings move every stream's window
+            for target in ([st] if st else self.streams.values()):
+                target.window.set()
+        elif isinstance(event, h2.events.ConnectionTerminated):
+            self.closed = True
+            for target in self.streams.values():
+                target.fail(ConnectionError(f"GOAWAY ({event.error_code!r})"))
+
+    def open_stream(self, headers: list[tuple[str, str]]) -> tuple[int, _Stream]:
+        sid = self.conn.get_next_available_stream_id()
+        self.conn.send_headers(sid, headers)
+        st = self.streams[sid] = _Stream()
+        self.flush()
+        return sid, st
+
+    async def send(self, sid: int, st: _Stream, data):
+        """Send `data` on stream `sid`, waiting for flow-control window as needed."""
+        view = memoryview(data)
+        while view:
+            if st.error:
+                raise st.error
+            # cleared before the window is read: an update arriving after this point,
+            # even during the drain below, leaves the event set
+            st.window.clear()
+            n = min(self.conn.local_flow_control_window(sid), self.conn.max_outbound_frame_size,
+                    len(view))
+            if n <= 0:
+                # the server only grants more window for data it has received
+                self.flush()
+                await self.writer.drain()
+                await st.window.wait()
+                continue
+            self.conn.send_data(sid, view[:n])
+            view = view[n:]
+        self.flush()
+        await self.writer.drain()
+
+    def release(self, sid: int):
+        st = self.streams.pop(sid, None)
+        if st and not st.ended.is_set() and not self.closed:
+            # abandoned mid-body (cancelled / failed): free the server's stream slot
+            try:
+                self.conn.reset_stream(sid)
+                self.flush()
+            except h2.exceptions.H2Error:
+                pass
+
+    def close(self):
+        self.reader_task.cancel()
+        self.writer.close()
+
+
+class H2Response:
+    def __init__(self, headers: dict[str, str], st: _Stream):
+        self.status = int(headers[":status"])
+        self.headers = headers
+        self._st = st
+
+    async def read(self) -> bytes:
+        await self._st.ended.wait()
+        if self._st.error:
+            raise self._st.error
+        return bytes(self._st.body)
+
+    async def text(self) -> str:
+        return (await self.read()).decode(errors="replace")
+
+    async def wait_for_close(self):
+        pass        # the stream is done once read; the connection stays shared
+
+
+class _Post:
+    def __init__(self, session: "H2Session", url: str, body: AsyncIterator[bytes]):
+        self.session = session
+        self.url = urlsplit(url)
+        self.body = body
+        self.conn = None
+        self.sid = None
+
+    async def __aenter__(self) -> H2Response:
+        u = self.url
+        self.conn = await self.session._acquire(u)
+        path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        try:
+            self.sid, st = self.conn.open_stream([
+                (":method", "POST"), (":scheme", u.scheme), (":authority", u.netloc),
+                (":path", path), ("content-type", "application/octet-stream"),
+            ])
+            # one DATA write per frame: header and payload share it
+            async for bufs in frame_writes(self.body):
+                await self.conn.send(self.sid, st, b"".join(bufs) if len(bufs) > 1 else bufs[0])
+            self.conn.conn.end_stream(self.sid)
+            self.conn.flush()
+            headers = await st.headers
+            if st.error:
+                raise st.error
+            return H2Response(headers, st)
+        except (OSError, h2.exceptions.H2Error) as e:
+            self.conn.release(self.sid)
+            raise ConnectionError(f"{type(e).__name__}: {e}") from e
+        except BaseException:
+            # __aexit__ won't run: free the stream slot (reset, GOAWAY, cancellation)
+            self.conn.release(self.sid)
+            raise
+
+    async def __aexit__(self, *exc):
+        self.conn.release(self.sid)
+
+
+class H2Session:
+    """Stand-in for aiohttp.ClientSession with just `post()`, over pooled HTTP/2 connections."""
+
+    def __init__(self, max_streams: int = 100):
+        if h2 is None:
+            raise SystemExit("--transport h2 needs the h2 package (pip install h2)")
+        self.max_streams = max_streams
+        self.pools: dict[tuple, list[H2Connection]] = {}
+        self.locks: dict[tuple, asyncio.Lock] = {}
+        self.connections_opened = 0
+        self.connections_peak = 0           # most connections open at once
+
+    @property
+    def connections_open(self) -> int:
+        return sum(not conn.closed for pool in self.pools.values() for conn in pool)
+
+    def post(self, url: str, data: AsyncIterator[bytes]) -> _Post:
+        return _Post(self, url, data)
+
+    async def _acquire(self, u) -> H2Connection:
+        """Least-loaded connection with a free stream slot; opens a new one if all are full."""
+        port = u.port or (443 if u.scheme == "https" else 80)
+        key = (u.scheme, u.hostname, port)
+        pool = self.pools.setdefault(key, [])
+        async with self.locks.setdefault(key, asyncio.Lock()):
+            pool[:] = [c for c in pool if not c.closed]
+            best = max(pool, key=lambda c: c.free, default=None)
+            if best is not None and best.free > 0:
+                return best
+            ctx = None
+            if u.scheme == "https":
+                ctx = ssl.create_default_context()
+                ctx.set_alpn_protocols(["h2"])
+            try:
+                reader, writer = await asyncio.open_connection(u.hostname, port, ssl=ctx)
+            except OSError as e:
+                raise ConnectionError(f"cannot connect to {u.hostname}:{port}: {e}") from e
+            conn = H2Connection(reader, writer, self.max_streams)
+            try:
+                # opening streams before the server's limit is known could exceed it
+                await asyncio.wait_for(conn.settings.wait(), SETTINGS_TIMEOUT)
+            except asyncio.TimeoutError:
+                conn.close()
+                raise ConnectionError(f"no HTTP/2 SETTINGS from {u.hostname}:{port}") from None
+            if conn.closed:
+                raise ConnectionError(f"{u.hostname}:{port} closed the HTTP/2 connection")
+            pool.append(conn)
+            self.connections_opened += 1
+            self.connections_peak = max(self.connections_peak, self.connections_open)
+            return conn
+
+    async def __aenter__(self) -> "H2Session":
+        return self
+
+    async def __aexit__(self, *exc):
+        for pool in self.pools.values():
+            for conn in pool:
+                conn.close()
@@ -0,0 +1,171 @@
+"""
+Event-loop backend selection (`--loop`) shared by stress_test.py and
+stress_test_stream.py, plus a micro-benchmark that compares the backends.
+
+uvloop is optional (`pip install uvloop`); without it only the stock asyncio
+loop is available. Run this file to benchmark every installed backend:
+
+    python loops.py --seconds 5 --streams 200
+
+Each backend pushes frames over `--streams` concurrent chunked POSTs into a
+discard server in a separate process, as fast as it can, once per transport
+(aiohttp and raw_http). The result is the maximum frames/s of the client,
+frames per CPU-second, and from that how many real-time streams one core can
+sustain.
+"""
+import argparse, asyncio, multiprocessing as mp, time
+
+import aiohttp
+from rich.console import Console
+from rich.table import Table
+
+from frame_protocol import frame_header
+from raw_http import RawSession
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+BACKENDS = ("asyncio", "uvloop")
+
+
+def add_loop_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--loop", choices=BACKENDS, default="asyncio",
+                    help="Event loop backend (uvloop must be installed)")
+
+
+def loop_from_argv(argv: list[str] | None = None) -> str:
+    """--loop from the command line; read before the script's own parser, which runs inside the loop."""
+    ap = argparse.ArgumentParser(add_help=False)
+    add_loop_args(ap)
+    return ap.parse_known_args(argv)[0].loop
+
+
+def available() -> list[str]:
+    return [name for name in BACKENDS if name != "uvloop" or uvloop is not None]
+
+
+def loop_factory(name: str):
+    if name == "uvloop":
+        if uvloop is None:
+            raise SystemExit("--loop uvloop needs the uvloop package (pip install uvloop)")
+        return uvloop.new_event_loop
+    return asyncio.new_event_loop
+
+
+def run(coro, name: str = "asyncio"):
+    """asyncio.run() on the chosen backend."""
+    try:
+        factory = loop_factory(name)
+    except SystemExit:
+        coro.close()
+        raise
+    with asyncio.Runner(loop_factory=factory) as runner:
+        return runner.run(coro)
+
+
+# ───────────────────────────── micro-benchmark ───────────────────────────────
+class _Discard(asyncio.Protocol):
+    def data_received(self, data: bytes):
+        pass
+
+
+def _sink(port_q: mp.Queue):
+    """Child process: accept connections and throw every byte away."""
+    async def serve():
+        server = await asyncio.get_running_loop().create_server(_Discard, "127.0.0.1", 0)
+        port_q.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+async def _push(url: str, streams: int, seconds: float, page: int, transport: str) -> dict:
+    payload = bytes(page)
+    hdr = frame_header(1, page)
+    frames = 0
+
+    async def body():
+        nonlocal frames
+        while True:
+            yield hdr
+            yield payload
+            frames += 1
+
+    async def one(session: aiohttp.ClientSession | RawSession):
+        try:
+            async with session.post(url, data=body()) as resp:
+                await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError):
+            pass
+
+    if transport == "raw":
+        session = RawSession()
+    else:
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=None),
+                                        timeout=aiohttp.ClientTimeout(total=None))
+    async with session:
+        tasks = [asyncio.create_task(one(session)) for _ in range(streams)]
+        await asyncio.sleep(0.5)                # let every connection get going
+        f0, t0, c0 = frames, time.monotonic(), time.process_time()
+        await asyncio.sleep(seconds)
+        n, wall, cpu = frames - f0, time.monotonic() - t0, time.process_time() - c0
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return {"frames_per_s": n / wall, "frames_per_cpu_s": n / cpu if cpu else 0.0,
+            "cpu_pct": 100 * cpu / wall}
+
+
+def benchmark(streams: int, seconds: float, page: int, bytes_per_sec: int) -> list[dict]:
+    port_q = mp.Queue()
+    sink = mp.Process(target=_sink, args=(port_q,), daemon=True)
+    sink.start()
+    try:
+        url = f"http://127.0.0.1:{port_q.get(timeout=10)}/recordings_stream"
+        rows = []
+        for name in available():
+            for transport in ("aiohttp", "raw"):
+                r = run(_push(url, streams, seconds, page, transport), name)
+                # one real-time listener sends bytes_per_sec / page frames per second
+                r["streams_per_core"] = r["frames_per_cpu_s"] * page / bytes_per_sec
+                rows.append({"loop": name, "transport": transport, **r})
+        return rows
+    finally:
+        sink.terminate()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare event-loop backends for the stress-test clients.")
+    ap.add_argument("-s", "--seconds", type=float, default=5.0,
+                    help="Measurement time per backend")
+    ap.add_argument("-n", "--streams", type=int, default=200,
+                    help="Concurrent streams pushing frames")
+    ap.add_argument("--page", type=int, default=32_768,
+                    help="Frame payload size in bytes")
+    ap.add_argument("--bytes-per-sec", type=int, default=88_200,
+                    help="Audio byte rate of one real-time stream (default 44.1 kHz 16-bit mono)")
+    args = ap.parse_args()
+
+    rows = benchmark(args.streams, args.seconds, args.page, args.bytes_per_sec)
+    table = Table(title=f"Event loops, {args.streams} streams × {args.page} B frames",
+                  show_header=True, header_style="bold magenta")
+    for col in ("loop", "transport", "frames/s", "frames/CPU-s", "client CPU %", "streams/core"):
+        table.add_column(col, justify="right")
+    for r in rows:
+        table.add_row(r["loop"], r["transport"], f"{r['frames_per_s']:,.0f}",
+                      f"{r['frames_per_cpu_s']:,.0f}", f"{r['cpu_pct']:.0f}",
+                      f"{r['streams_per_core']:,.0f}")
+    console = Console()
+    console.print(table)
+    best = max(rows, key=lambda r: r["frames_per_cpu_s"])
+    console.print(f"[bold]Fastest:[/bold] [cyan]--loop {best['loop']} --transport {best['transport']}[/cyan]")
+    if uvloop is None:
+        console.print("uvloop is not installed; pip install uvloop to compare it")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Periodic aggregate metrics output shared by stress_test.py and stress_test_stream.py.
+
+Used by `--headless` runs (and any run given `--metrics-out`): one row of
+aggregate numbers per interval, as JSON lines or CSV, for later analysis.
+"""
+import argparse, csv, json, sys
+from pathlib import Path
+
+SUB_BITS = 5                 # 32 sub-buckets per power of two → ≤ ~3 % relative error
+SUB = 1 << SUB_BITS
+MAX_US = (1 << 36) - 1       # clamp at ~19 h; caps the bucket count at 32 * 32
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def _bucket(us: int) -> int:
+    if us < SUB:
+        return us
+    shift = us.bit_length() - SUB_BITS - 1
+    return SUB * shift + (us >> shift)
+
+
+def _bucket_mid(idx: int) -> float:
+    """Midpoint (µs) of the values that land in bucket `idx`."""
+    if idx < 2 * SUB:
+        return float(idx)
+    shift, mant = idx // SUB - 1, idx % SUB + SUB
+    return ((mant << shift) + ((mant + 1) << shift) - 1) / 2
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram in the spirit of HdrHistogram.
+
+    Values are stored in µs in power-of-two ranges split into 32 linear
+    sub-buckets, so memory is bounded (≤ 1 K buckets, only non-empty ones are
+    kept) regardless of how many samples are recorded. Histograms merge by
+    adding counts, which is how per-listener data becomes run-wide percentiles.
+    """
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0       # seconds, for the mean
+        self.min = None
+        self.max = None
+
+    def record(self, seconds: float):
+        us = min(max(int(seconds * 1e6), 0), MAX_US)
+        idx = _bucket(us)
+        self.counts[idx] = self.counts.get(idx, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        for idx, n in other.counts.items():
+            self.counts[idx] = self.counts.get(idx, 0) + n
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    def since(self, earlier: "LatencyHistogram") -> "LatencyHistogram":
+        """Samples recorded after `earlier` (a previous copy of this histogram)."""
+        out = LatencyHistogram()
+        for idx, n in self.counts.items():
+            n -= earlier.counts.get(idx, 0)
+            if n:
+                out.counts[idx] = n
+        out.count = self.count - earlier.count
+        out.total = self.total - earlier.total
+        return out
+
+    def copy(self) -> "LatencyHistogram":
+        return LatencyHistogram().merge(self)
+
+    def percentile(self, q: float) -> float:
+        """Value (seconds) at percentile `q` (0–100); 0.0 if empty."""
+        if not self.count:
+            return 0.0
+        rank = max(1, -(-self.count * q // 100))    # ceil
+        seen = 0
+        for idx in sorted(self.counts):
+            seen += self.counts[idx]
+            if seen >= rank:
+                value = _bucket_mid(idx) / 1e6
+                if self.min is not None:
+                    value = min(max(value, self.min), self.max)
+                return value
+        return self.max or 0.0
+
+    def summary(self, prefix: str = "") -> dict:
+        """Percentiles in ms, keyed like `<prefix>p99_ms`, plus count / mean / max."""
+        out = {f"{prefix}count": self.count,
+               f"{prefix}mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0}
+        for q in PERCENTILES:
+            out[f"{prefix}p{q:g}_ms".replace(".", "_")] = round(self.percentile(q) * 1000, 3)
+        top = self.max
+        if top is None:     # interval histograms from since() only know their buckets
+            top = _bucket_mid(max(self.counts)) / 1e6 if self.counts else 0.0
+        out[f"{prefix}max_ms"] = round(top * 1000, 3)
+        return out
+
+
+def merged(hists) -> LatencyHistogram:
+    out = LatencyHistogram()
+    for h in hists:
+        out.merge(h)
+    return out
+
+
+def fmt_percentiles(hist: LatencyHistogram) -> str:
+    return "  ".join(f"p{q:g} {hist.percentile(q) * 1000:.1f}ms" for q in PERCENTILES)
+
+
+class MetricsWriter:
+    """Write one dict per interval to a file (or stdout for "-") as JSON lines or CSV."""
+
+    def __init__(self, path: str, fmt: str = "jsonl"):
+        self.fmt = fmt
+        self.path = path
+        self.fh = sys.stdout if path == "-" else open(path, "w", newline="")
+        self._csv = None
+        self._steps_fh = None
+        self._steps = None
+
+    def write(self, row: dict):
+        if self.fmt == "csv":
+            if self._csv is None:
+                # columns are fixed by the first row
+                self._csv = csv.DictWriter(self.fh, fieldnames=list(row), extrasaction="ignore")
+                self._csv.writeheader()
+            self._csv.writerow(row)
+        else:
+            self.fh.write(json.dumps(row) + "\n")
+        self.fh.flush()
+
+    def write_step(self, row: dict):
+        """
+        A ramp or sweep step row. JSON lines take it inline (it has no
+        elapsed_s). Its CSV columns differ from the interval rows, so CSV steps
+        go to `<name>.steps.csv` instead. On stdout they are left out, because
+        the end-of-run report lists them anyway.
+        """
+        if self.fmt != "csv":
+            self.write(row)
+            return
+        if self.path == "-":
+            return
+        if self._steps is None:
+            path = Path(self.path)
+            self._steps_fh = open(path.with_name(f"{path.stem}.steps.csv"), "w", newline="")
+            self._steps = csv.DictWriter(self._steps_fh, fieldnames=list(row), extrasaction="ignore")
+            self._steps.writeheader()
+        self._steps.writerow({key: ";".join(value) if isinstance(value, list) else value
+                              for key, value in row.items()})
+        self._steps_fh.flush()
+
+    def close(self):
+        if self.fh is not sys.stdout:
+            self.fh.close()
+        if self._steps_fh:
+            self._steps_fh.close()
+
+
+def add_metrics_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--headless", action="store_true",
+                    help="Disable the Rich dashboard and only write periodic metrics")
+    ap.add_argument("--metrics-out", default=None,
+                    help="File to write periodic metrics to ('-' = stdout, default in --headless)")
+    ap.add_argument("--metrics-format", choices=("jsonl", "csv"), default="jsonl",
+                    help="Format of the metrics output")
+    ap.add_argument("--metrics-interval", type=float, default=5.0,
+                    help="Seconds between metrics rows")
+
+
+def open_metrics(args: argparse.Namespace) -> MetricsWriter | None:
+    """Return the writer requested on the command line, or None if metrics are off."""
+    path = args.metrics_out or ("-" if args.headless else None)
+    if path is None:
+        return None
+    return MetricsWriter(path, args.metrics_format)
+
+
+def rate(curr: float, prev: float, dt: float) -> float:
+    return round((curr - prev) / dt, 3) if dt > 0 else 0.0
@@ -0,0 +1,204 @@
+"""
+Local stand-in for the aggregator container, for benchmarking the stress-test
+clients and checking the frame protocol without an aggregator-pi deployment.
+
+  POST /recordings_stream?listener_id=…   6-byte framed stream (see make_frame)
+  GET  /recordings_stream?listener_id=…   resume point: pages of the listener's current file received
+  POST /recordings_upload                 multipart upload (listener_id + file)
+  GET  /stats                             counters as JSON
+
+Artificial latency, per-connection bandwidth caps and failure injection make
+it possible to see how the clients behave against a slow or flaky server.
+"""
+import argparse, asyncio, json, random, time
+
+import aiohttp
+from aiohttp import web
+
+from capture import CaptureWriter
+from frame_protocol import FrameDecoder, StreamVerifier
+from metrics import LatencyHistogram
+
+stats = {
+    "streams_open": 0, "streams_total": 0,
+    "frames": 0, "pcm_bytes": 0, "files": 0, "meta_frames": 0,     # files = header frames
+    "seq_errors": 0, "truncated": 0, "disconnects": 0,     # disconnects: client left mid-stream
+    "uploads": 0, "upload_bytes": 0,
+    "injected_failures": 0, "injected_drops": 0,
+    # from the SEQ_META frames (stress_test_stream.py --meta-every)
+    "files_verified": 0, "corrupt_files": 0, "missing_pages": 0, "resumes": 0,
+}
+one_way = LatencyHistogram()    # client send time (metadata frames) → receipt
+verifiers: dict[str, StreamVerifier] = {}   # per listener, kept across connections for resume
+
+
+DECODER_COUNTERS = ("frames", "files", "meta_frames", "seq_errors", "pcm_bytes")
+VERIFIER_COUNTERS = {"files_ok": "files_verified", "corrupt_files": "corrupt_files",
+                     "missing_pages": "missing_pages", "resumes": "resumes"}
+
+
+def sync_stats(decoder: FrameDecoder, verifier: StreamVerifier, synced: dict):
+    """Add what the decoder / verifier counted since the last sync to the global stats."""
+    for src, key in [(decoder, k) for k in DECODER_COUNTERS] + \
+                    [(verifier, k) for k in VERIFIER_COUNTERS]:
+        value = getattr(src, key)
+        stats[VERIFIER_COUNTERS.get(key, key)] += value - synced.get(key, 0)
+        synced[key] = value
+
+
+async def inject(cfg: argparse.Namespace):
+    """Artificial latency, then maybe fail the request."""
+    delay = cfg.latency_ms + random.uniform(0, cfg.jitter_ms)
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+    if cfg.fail_rate and random.random() < cfg.fail_rate:
+        stats["injected_failures"] += 1
+        raise web.HTTPServiceUnavailable(text="injected failure")
+
+
+async def throttle(started: float, received: int, bandwidth: int):
+    """Sleep so `received` bytes since `started` don't exceed `bandwidth` bytes/s."""
+    if bandwidth > 0:
+        ahead = received / bandwidth - (time.monotonic() - started)
+        if ahead > 0:
+            await asyncio.sleep(ahead)
+
+
+async def handle_stream(request: web.Request) -> web.Response:
+    cfg = request.app["cfg"]
+    await inject(cfg)
+    listener_id = request.query.get("listener_id", "")
+    verifier = verifiers.get(listener_id)
+    if verifier is None:
+        verifier = verifiers[listener_id] = StreamVerifier(on_latency=one_way.record)
+    decoder = FrameDecoder()
+    synced = {key: getattr(verifier, key) for key in VERIFIER_COUNTERS}
+    capture = request.app["capture"]
+    cap_idx = capture.open(listener_id) if capture else None
+    stats["streams_open"] += 1
+    stats["streams_total"] += 1
+    started, received = time.monotonic(), 0
+    try:
+        async for chunk in request.content.iter_any():
+            received += len(chunk)
+            decoder.feed(chunk)
+            for frame in decoder:
+                meta = verifier.add(frame)
+                if meta and meta.get("type") == "resume":
+                    decoder.resume(meta["page"])
+                if capture:
+                    capture.frame(cap_idx, frame.seq, frame.payload)
+            sync_stats(decoder, verifier, synced)
+            if cfg.drop_rate and random.random() < cfg.drop_rate:
+                stats["injected_drops"] += 1
+                request.transport.close()
+                raise web.HTTPServiceUnavailable(text="injected drop")
+            await throttle(started, received, cfg.bandwidth)
+    except (ConnectionResetError, aiohttp.ClientPayloadError):
+        # the client went away (end of a run, a drop): count it rather than log a traceback
+        stats["disconnects"] += 1
+    finally:
+        stats["streams_open"] -= 1
+        if capture:
+            capture.close_stream(cap_idx)
+        if decoder.pending:
+            stats["truncated"] += 1
+    return web.json_response({"listener_id": listener_id,
+                              "bytes": received, "files": decoder.files,
+                              "seq_errors": decoder.seq_errors})
+
+
+async def handle_resume(request: web.Request) -> web.Response:
+    """How many pages of its current file a reconnecting listener can skip."""
+    listener_id = request.query.get("listener_id", "")
+    verifier = verifiers.get(listener_id)
+    page = verifier.pages if verifier and verifier.in_file else 0
+    return web.json_response({"listener_id": listener_id, "page": page})
+
+
+async def handle_upload(request: web.Request) -> web.Response:
+    cfg = request.app["cfg"]
+    await inject(cfg)
+    listener_id, size = None, 0
+    started = time.monotonic()
+    reader = await request.multipart()
+    async for part in reader:
+        if part.name == "listener_id":
+            listener_id = await part.text()
+        elif part.name == "file":
+            while chunk := await part.read_chunk():
+                size += len(chunk)
+                await throttle(started, size, cfg.bandwidth)
+    stats["uploads"] += 1
+    stats["upload_bytes"] += size
+    return web.json_response({"listener_id": listener_id, "bytes": size})
+
+
+async def handle_stats(request: web.Request) -> web.Response:
+    return web.json_response({**stats, **one_way.summary("one_way_")})
+
+
+async def reporter(app: web.Application):
+    """Print one JSON line of counters (plus rates) every --report seconds."""
+    interval = app["cfg"].report
+    prev, prev_t = dict(stats), time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        row = dict(stats)
+        row["pcm_bytes_per_s"] = round((row["pcm_bytes"] - prev["pcm_bytes"]) / (now - prev_t), 1)
+        row["frames_per_s"] = round((row["frames"] - prev["frames"]) / (now - prev_t), 1)
+        row.update(one_way.summary("one_way_"))
+        print(json.dumps(row), flush=True)
+        prev, prev_t = dict(stats), now
+
+
+async def start_reporter(app: web.Application):
+    if app["cfg"].report > 0:
+        app["reporter"] = asyncio.create_task(reporter(app))
+
+
+async def close_capture(app: web.Application):
+    if app["capture"]:
+        app["capture"].close()
+
+
+def make_app(cfg: argparse.Namespace) -> web.Application:
+    app = web.Application(client_max_size=cfg.max_upload)
+    app["cfg"] = cfg
+    app["capture"] = CaptureWriter(cfg.capture, time.monotonic) if cfg.capture else None
+    app.router.add_post("/recordings_stream", handle_stream)
+    app.router.add_get("/recordings_stream", handle_resume)
+    app.router.add_post("/recordings_upload", handle_upload)
+    app.router.add_get("/stats", handle_stats)
+    app.on_startup.append(start_reporter)
+    app.on_cleanup.append(close_capture)
+    return app
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Mock aggregator for local stress-test runs.")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("-p", "--port", type=int, default=8000)
+    ap.add_argument("--latency-ms", type=float, default=0.0,
+                    help="Delay before each request is accepted")
+    ap.add_argument("--jitter-ms", type=float, default=0.0,
+                    help="Extra random delay, uniform in [0, jitter]")
+    ap.add_argument("--bandwidth", type=int, default=0,
+                    help="Per-connection receive cap in bytes/s (0 = unlimited)")
+    ap.add_argument("--fail-rate", type=float, default=0.0,
+                    help="Fraction of requests answered with 503")
+    ap.add_argument("--drop-rate", type=float, default=0.0,
+                    help="Probability per received chunk of dropping a stream connection")
+    ap.add_argument("--max-upload", type=int, default=256 * 1024 * 1024,
+                    help="Largest accepted upload body in bytes")
+    ap.add_argument("--capture", default=None,
+                    help="Record every received stream to this file, for replay.py")
+    ap.add_argument("--report", type=float, default=5.0,
+                    help="Seconds between stats lines on stdout (0 = off)")
+    cfg = ap.parse_args()
+    web.run_app(make_app(cfg), host=cfg.host, port=cfg.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
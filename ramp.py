@@ -0,0 +1,134 @@
+"""
+Step-load capacity search shared by stress_test.py and stress_test_stream.py.
+
+The ramp adds listeners in steps, holds each step, measures it and stops at
+the first step that breaches an SLO. The last passing step is the maximum
+sustainable listener count. A sweep holds the listener count and steps a
+parameter (e.g. page size) through a list of values instead.
+"""
+import argparse, asyncio, time
+from typing import Callable
+
+from rich.console import Console
+from rich.table import Table
+
+
+def add_ramp_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--ramp-step", type=int, default=0,
+                    help="Ramp mode: add this many listeners per step, up to --num-sources")
+    ap.add_argument("--ramp-hold", type=float, default=30.0,
+                    help="Seconds each step is measured")
+    ap.add_argument("--ramp-settle", type=float, default=5.0,
+                    help="Seconds to let each step settle before measuring it")
+    ap.add_argument("--slo-p99-ms", type=float, default=None,
+                    help="Stop the ramp when p99 latency exceeds this")
+    ap.add_argument("--slo-error-pct", type=float, default=1.0,
+                    help="Stop the ramp when the error rate exceeds this")
+
+
+async def run_ramp(max_sources: int,
+                   step: int,
+                   hold: float,
+                   settle: float,
+                   set_active: Callable[[int], None],
+                   snapshot: Callable[[], dict],
+                   measure: Callable[[dict, dict, float, int], dict],
+                   slo: dict[str, float | None],
+                   on_step: Callable[[dict], None] | None = None) -> list[dict]:
+    """
+    Drive the ramp and return one result row per step.
+
+    `measure(before, after, seconds, n)` turns two snapshots into a row; any row
+    key named in `slo` is compared against its limit.
+    """
+    results = []
+    n = 0
+    while n < max_sources:
+        n = min(n + step, max_sources)
+        set_active(n)
+        await asyncio.sleep(settle)
+        before, t0 = snapshot(), time.monotonic()
+        await asyncio.sleep(hold)
+        row = {"step": len(results) + 1, "listeners": n,
+               **measure(before, snapshot(), time.monotonic() - t0, n)}
+        row["breached"] = [key for key, limit in slo.items()
+                           if limit is not None and row.get(key, 0) > limit]
+        results.append(row)
+        if on_step:
+            on_step(row)
+        if row["breached"]:
+            break
+    return results
+
+
+async def run_sweep(name: str,
+                    values: list,
+                    hold: float,
+                    settle: float,
+                    set_value: Callable[[object], None],
+                    snapshot: Callable[[], dict],
+                    measure: Callable[[dict, dict, float, int], dict],
+                    n: int,
+                    on_step: Callable[[dict], None] | None = None) -> list[dict]:
+    """Apply each of `values` in turn, settle, hold and measure; one row per value."""
+    results = []
+    for value in values:
+        set_value(value)
+        await asyncio.sleep(settle)
+        before, t0 = snapshot(), time.monotonic()
+        await asyncio.sleep(hold)
+        row = {"step": len(results) + 1, name: value, "listeners": n,
+               **measure(before, snapshot(), time.monotonic() - t0, n)}
+        results.append(row)
+        if on_step:
+            on_step(row)
+    return results
+
+
+def max_sustainable(results: list[dict]) -> int:
+    passed = [row["listeners"] for row in results if not row["breached"]]
+    return passed[-1] if passed else 0
+
+
+def print_results(results: list[dict], title: str, summary: tuple[str, object], plain: bool):
+    """Result rows as a Rich table (or plain text), then one `label: value` summary line."""
+    breach = "breached" in results[0]
+    cols = [key for key in results[0] if key != "breached"]
+    label, value = summary
+    if plain:
+        print(" ".join(cols) + (" breached" if breach else ""))
+        for row in results:
+            cells = [str(row[c]) for c in cols]
+            if breach:
+                cells.append(",".join(row["breached"]) or "-")
+            print(" ".join(cells))
+        print(f"{label}: {value}")
+        return
+
+    table = Table(title=title, show_header=True, header_style="bold magenta")
+    for col in cols:
+        table.add_column(col, justify="right")
+    if breach:
+        table.add_column("breached")
+    for row in results:
+        cells = [str(row[c]) for c in cols]
+        if breach:
+            cells.append(", ".join(row["breached"]) or "-")
+        table.add_row(*cells, style="red" if breach and row["breached"] else None)
+    console = Console()
+    console.print(table)
+    console.print(f"[bold]{label}:[/bold] [cyan]{value}[/cyan]")
+
+
+def print_ramp_report(results: list[dict], plain: bool = False):
+    if results:
+        print_results(results, "Ramp results",
+                      ("Max sustainable listeners", max_sustainable(results)), plain)
+
+
+def print_sweep_report(results: list[dict], name: str, plain: bool = False):
+    if results:
+        # paced streams send in real time at any size, so rank by latency, not throughput
+        key = "lag_p99_ms" if "lag_p99_ms" in results[0] else "p99_ms"
+        best = min(results, key=lambda row: (row[key], row["p99_ms"]))
+        print_results(results, f"{name} sweep", (f"Lowest {key} at {name}", best[name]), plain)
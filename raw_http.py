@@ -0,0 +1,132 @@
+"""
+Minimal HTTP/1.1 chunked-upload client on asyncio streams, for `--transport raw`.
+
+aiohttp sends every chunk of an async-generator body through its payload
+writer, which costs noticeably per frame at high listener counts. This client
+only does what the stream test needs: one POST per connection, chunked body,
+then read the response. Each write goes out with a single `writelines` call, and
+the chunk-size lines are cached, so every full 32 KiB page reuses the same
+bytes object.
+
+`RawSession.post(url, data=...)` mimics the small part of aiohttp's API the
+streamer uses (async context manager, `resp.status`, `resp.text()`,
+`resp.wait_for_close()`), so the two transports are interchangeable.
+"""
+import asyncio, ssl
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+
+from frame_protocol import frame_writes
+
+CRLF = b"\r\n"
+LAST_CHUNK = b"0\r\n\r\n"
+
+_size_lines: dict[int, bytes] = {}
+
+
+def size_line(n: int) -> bytes:
+    """Chunk-size line for an `n`-byte chunk, cached (page sizes repeat endlessly)."""
+    line = _size_lines.get(n)
+    if line is None:
+        line = _size_lines[n] = b"%x\r\n" % n
+    return line
+
+
+class RawResponse:
+    def __init__(self, status: int, headers: dict[str, str],
+                 reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.status = status
+        self.headers = headers
+        self._reader = reader
+        self._writer = writer
+
+    async def read(self) -> bytes:
+        if "chunked" in self.headers.get("transfer-encoding", ""):
+            body = bytearray()
+            while n := int((await self._reader.readline()).split(b";")[0], 16):
+                body += await self._reader.readexactly(n)
+                await self._reader.readline()
+            await self._reader.readline()       # trailer terminator
+            return bytes(body)
+        if "content-length" in self.headers:
+            return await self._reader.readexactly(int(self.headers["content-length"]))
+        return await self._reader.read()
+
+    async def text(self) -> str:
+        return (await self.read()).decode(errors="replace")
+
+    async def wait_for_close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except OSError:
+            pass
+
+
+class _Post:
+    def __init__(self, url: str, body: AsyncIterator[bytes]):
+        self.url = urlsplit(url)
+        self.body = body
+        self.resp = None
+
+    async def __aenter__(self) -> RawResponse:
+        u = self.url
+        port = u.port or (443 if u.scheme == "https" else 80)
+        try:
+            reader, writer = await asyncio.open_connection(
+                u.hostname, port, ssl=ssl.create_default_context() if u.scheme == "https" else None)
+        except OSError as e:
+            raise ConnectionError(f"cannot connect to {u.hostname}:{port}: {e}") from e
+        try:
+            path = u.path or "/"
+            if u.query:
+                path += "?" + u.query
+            writer.write(f"POST {path} HTTP/1.1\r\nHost: {u.netloc}\r\n"
+                         "Content-Type: application/octet-stream\r\n"
+                         "Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n".encode())
+            await self._send_body(writer)
+            self.resp = await self._read_head(reader, writer)
+            return self.resp
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            writer.close()
+            raise ConnectionError(f"{type(e).__name__}: {e}") from e
+        except BaseException:
+            writer.close()
+            raise
+
+    async def _send_body(self, writer: asyncio.StreamWriter):
+        # one chunk per frame: header and payload share it
+        async for bufs in frame_writes(self.body):
+            writer.writelines((size_line(sum(map(len, bufs))), *bufs, CRLF))
+            await writer.drain()
+        writer.write(LAST_CHUNK)
+        await writer.drain()
+
+    @staticmethod
+    async def _read_head(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> RawResponse:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("server closed the connection without a response")
+        status = int(status_line.split()[1])
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        return RawResponse(status, headers, reader, writer)
+
+    async def __aexit__(self, *exc):
+        if self.resp is not None:
+            self.resp._writer.close()
+
+
+class RawSession:
+    """Stand-in for aiohttp.ClientSession with just `post()`; one connection per request."""
+
+    def post(self, url: str, data: AsyncIterator[bytes]) -> _Post:
+        return _Post(url, data)
+
+    async def __aenter__(self) -> "RawSession":
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
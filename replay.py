@@ -0,0 +1,131 @@
+"""
+Re-drive captured listener traffic (see capture.py) against a stream endpoint.
+
+Every captured stream POST is replayed as its own POST with the original
+listener_id, seq numbers, payloads and timing. `--speed` scales time:
+1 = as captured, N = N× faster, 0 = as fast as possible (no waits).
+
+    python mock_aggregator.py --capture incident.rcap        # record
+    python replay.py incident.rcap --speed 4 --url http://aggregator:8000/recordings_stream
+"""
+import argparse, asyncio, json, time
+
+import aiohttp
+
+from capture import Session, read_capture
+from frame_protocol import frame_header
+from metrics import LatencyHistogram
+from stress_test_stream import Pacer, add_transport_args, make_session
+
+totals = {"sessions": 0, "frames": 0, "bytes": 0, "errors": 0, "open": 0}
+lag_hist = LatencyHistogram()       # frame release lateness vs. the scaled capture timeline
+
+
+async def replay_session(s: Session,
+                         listener_id: str,
+                         at,
+                         speed: float,
+                         url: str,
+                         session: aiohttp.ClientSession,
+                         pacer: Pacer):
+    """Replay one captured POST; `at(t)` maps capture time to a monotonic deadline."""
+    if speed:
+        await pacer.wait_until(at(s.start))
+
+    async def body_gen():
+        for t, seq, payload in s.frames:
+            if speed:
+                lag_hist.record(await pacer.wait_until(at(t)))
+            yield frame_header(seq, len(payload))
+            yield payload
+            totals["frames"] += 1
+            totals["bytes"] += len(payload)
+        if speed:
+            # keep the connection open as long as the captured one was
+            await pacer.wait_until(at(s.end))
+
+    totals["open"] += 1
+    try:
+        async with session.post(f"{url}?listener_id={listener_id}", data=body_gen()) as resp:
+            await resp.read()
+            if resp.status >= 400:
+                totals["errors"] += 1
+            else:
+                totals["sessions"] += 1
+    except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError):
+        totals["errors"] += 1
+    finally:
+        totals["open"] -= 1
+
+
+async def reporter(interval: float):
+    """One JSON line of counters (plus lag percentiles) every `interval` seconds."""
+    prev, prev_t = dict(totals), time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        row = dict(totals)
+        row["bytes_per_s"] = round((row["bytes"] - prev["bytes"]) / (now - prev_t), 1)
+        row.update(lag_hist.summary("lag_"))
+        print(json.dumps(row), flush=True)
+        prev, prev_t = dict(totals), now
+
+
+async def main():
+    ap = argparse.ArgumentParser(description="Replay a listener traffic capture.")
+    ap.add_argument("capture", help="Capture file written by mock_aggregator.py --capture")
+    ap.add_argument("-u", "--url", default="http://localhost:8000/recordings_stream",
+                    help="Stream endpoint to replay against")
+    ap.add_argument("-x", "--speed", type=float, default=1.0,
+                    help="Time scale: 1 = as captured, N = N× faster, 0 = as fast as possible")
+    ap.add_argument("-k", "--copies", type=int, default=1,
+                    help="Replay every session this many times in parallel "
+                         "(listener ids get a _r<k> suffix when > 1)")
+    add_transport_args(ap)
+    ap.add_argument("--report", type=float, default=5.0,
+                    help="Seconds between progress lines (0 = off)")
+    args = ap.parse_args()
+
+    sessions = read_capture(args.capture)
+    if not sessions:
+        print("Capture holds no streams")
+        return
+    first = sessions[0].start
+    span = max(s.end for s in sessions) - first
+    listeners = len({s.listener_id for s in sessions})
+    print(f"{len(sessions)} streams from {listeners} listeners over {span:.1f}s; "
+          f"replaying ×{args.copies} at " + (f"{args.speed:g}× speed" if args.speed else "full speed"))
+
+    t0 = time.monotonic() + 0.5    # small lead so the first deadlines aren't already late
+
+    def at(t: float) -> float:
+        return t0 + (t - first) / args.speed
+
+    async with make_session(args.transport, args.h2_max_streams) as session:
+        pacer = Pacer()
+        bg = [asyncio.create_task(pacer.run())]
+        if args.report > 0:
+            bg.append(asyncio.create_task(reporter(args.report)))
+        started = time.monotonic()
+        try:
+            await asyncio.gather(*(
+                replay_session(s, s.listener_id if args.copies == 1 else f"{s.listener_id}_r{k}",
+                               at, args.speed, args.url, session, pacer)
+                for s in sessions for k in range(args.copies)
+            ))
+        finally:
+            for task in bg:
+                task.cancel()
+            await asyncio.gather(*bg, return_exceptions=True)
+
+    elapsed = time.monotonic() - started
+    print(json.dumps({**totals, "elapsed_s": round(elapsed, 3),
+                      "bytes_per_s": round(totals["bytes"] / elapsed, 1) if elapsed else 0.0,
+                      **lag_hist.summary("lag_")}))
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nStopped by user")
@@ -0,0 +1,140 @@
+"""
+End-of-run report shared by stress_test.py and stress_test_stream.py.
+
+However a run ends (Ctrl-C, a ramp or sweep finishing), the scripts print a
+summary: totals, errors by kind, latency percentiles and the listeners that
+fell furthest behind their target. With `--report-out PATH` the full report,
+including every listener, is also written as JSON for comparing runs across
+aggregator builds (see compare.py). The file is written to a temporary name and renamed into
+place, so it is either complete or not there at all.
+
+`rt_ratio` is achieved / target: audio seconds sent per second the listener
+should have been streaming (stream), or uploads done per upload due (upload).
+"""
+import argparse, json, os, tempfile, time
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+REPORT_VERSION = 1
+WORST_SHOWN = 10        # listeners listed in the printed summary (the JSON has all)
+NOT_SHOWN = {"mode", "bytes"}   # per-listener fields left out of the printed table
+
+
+def add_report_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--report-out", default=None, metavar="PATH",
+                    help="Also write the end-of-run report as JSON to PATH")
+
+
+def ratio(achieved: float, target: float) -> float | None:
+    return round(achieved / target, 3) if target > 0 else None
+
+
+def build_report(script: str, args: argparse.Namespace, started: float, elapsed: float,
+                 totals: dict, errors: dict, latency: dict, listeners: dict,
+                 steps: list[dict] | None = None) -> dict:
+    """
+    `started` is the wall-clock start (epoch s); `latency` maps names to
+    LatencyHistograms; `steps` are the rows of a ramp or sweep, if one ran.
+    """
+    settings = {key: value for key, value in vars(args).items()
+                if isinstance(value, (str, int, float, bool, list, type(None)))}
+    return {
+        "version": REPORT_VERSION,
+        "script": script,
+        "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(started)),
+        "elapsed_s": round(elapsed, 3),
+        "settings": settings,
+        "totals": totals,
+        "errors": dict(sorted(errors.items(), key=lambda kv: -kv[1])),
+        "latency": {name: hist.summary() for name, hist in latency.items()},
+        "listeners": listeners,
+        "steps": steps or [],
+    }
+
+
+def save_report(report: dict, args: argparse.Namespace):
+    """Print the summary, then write the JSON file if --report-out was given."""
+    print_report(report, plain=args.headless)
+    if args.report_out:
+        try:
+            write_report(args.report_out, report)
+        except OSError as e:
+            raise SystemExit(f"cannot write report {args.report_out}: {e}")
+
+
+def write_report(path: str | Path, report: dict):
+    """Write `report` as JSON via a temporary file in the same directory + rename."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as fh:
+            json.dump(report, fh, indent=2)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load_report(path: str | Path) -> dict:
+    report = json.loads(Path(path).read_text())
+    if not isinstance(report, dict) or report.get("version") != REPORT_VERSION:
+        raise ValueError(f"{path}: not a version {REPORT_VERSION} run report")
+    return report
+
+
+def _worst(report: dict) -> list[tuple[str, dict]]:
+    rows = sorted(report["listeners"].items(),
+                  key=lambda kv: (kv[1]["rt_ratio"] is None, kv[1]["rt_ratio"] or 0.0))
+    return rows[:WORST_SHOWN]
+
+
+def print_report(report: dict, plain: bool = False):
+    totals, errors, latency = report["totals"], report["errors"], report["latency"]
+    worst = _worst(report)
+    cols = [c for c in worst[0][1] if c not in NOT_SHOWN] if worst else []
+    latency = {name: s for name, s in latency.items() if s["count"]}
+    if plain:
+        print(f"run report: {report['script']} {report['elapsed_s']}s")
+        print(" ".join(f"{key}={value}" for key, value in totals.items()))
+        if errors:
+            print("errors: " + " ".join(f"{kind}={n}" for kind, n in errors.items()))
+        for name, s in latency.items():
+            print(f"{name}: n={s['count']} p50={s['p50_ms']}ms p99={s['p99_ms']}ms max={s['max_ms']}ms")
+        if worst:
+            print("listener " + " ".join(cols))
+            for lid, row in worst:
+                print(lid + " " + " ".join(str(row[c]) for c in cols))
+        return
+
+    console = Console()
+    summary = Table(title=f"Run report: {report['script']}, {report['elapsed_s']:.0f}s",
+                    show_header=False)
+    summary.add_column(style="bold")
+    summary.add_column(justify="right", style="cyan")
+    for key, value in totals.items():
+        summary.add_row(key, f"{value:,}" if isinstance(value, int) else str(value))
+    for kind, n in errors.items():
+        summary.add_row(f"error: {kind}", f"{n:,}")
+    console.print(summary)
+
+    lat = Table(show_header=True, header_style="bold magenta")
+    for col in ("latency", "count", "p50 ms", "p90 ms", "p99 ms", "max ms"):
+        lat.add_column(col, justify="right")
+    for name, s in latency.items():
+        lat.add_row(name, f"{s['count']:,}", str(s["p50_ms"]), str(s["p90_ms"]),
+                    str(s["p99_ms"]), str(s["max_ms"]))
+    console.print(lat)
+
+    if worst:
+        table = Table(title=f"Lowest rt_ratio (of {len(report['listeners'])} listeners)",
+                      show_header=True, header_style="bold magenta")
+        table.add_column("listener")
+        for col in cols:
+            table.add_column(col, justify="right")
+        for lid, row in worst:
+            table.add_row(lid, *("-" if row[c] is None else str(row[c]) for c in cols))
+        console.print(table)
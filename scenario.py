@@ -0,0 +1,90 @@
+"""
+Listener groups from a scenario file, for `stress_test_stream.py --scenario`.
+
+A scenario describes the fleet as groups of identical listeners. JSON is
+always supported; YAML needs PyYAML (pip install pyyaml). Any key left out of
+a group falls back to `defaults:`, then to the command-line flags.
+
+    defaults:
+      url: http://localhost:8000/recordings_stream
+    groups:
+      - name: pi-fast           # listener ids: pi-fast01, pi-fast02, …
+        count: 40
+        corpus: ./wav_samples   # or file: ./sample.wav, or synth: tone:freq=440
+        sample_rate: 44100      # optional: every source must have this rate
+        page_size: 32768
+        interval: 0
+        stagger: 5              # random start offset, seconds
+        reconnect: {max_delay: 60, max_attempts: 0}
+      - name: pi-uploader
+        count: 10
+        mode: upload            # whole-file multipart uploads instead of a stream
+        file: ./sample.wav
+        interval: 30
+        jitter: 20              # some devices upload after 10 s, some after 50 s
+        url: http://localhost:8000/recordings_upload
+"""
+import json
+from pathlib import Path
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from frame_protocol import MAX_PAYLOAD
+
+MODES = ("stream", "upload")
+GROUP_KEYS = {"name", "count", "mode", "file", "corpus", "synth", "sample_rate", "page_size",
+              "interval", "stagger", "jitter", "url", "reconnect"}
+RECONNECT_KEYS = {"max_delay", "max_attempts"}
+
+
+def read_scenario(path: str | Path) -> dict:
+    path = Path(path)
+    text = path.read_text()
+    if path.suffix.lower() in (".yaml", ".yml"):
+        if yaml is None:
+            raise ValueError(f"{path}: YAML scenarios need PyYAML (pip install pyyaml), or use JSON")
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ValueError(f"{path}: {e}") from None
+    else:
+        data = json.loads(text)
+    if not isinstance(data, dict) or not isinstance(data.get("groups"), list):
+        raise ValueError(f"{path}: expected a mapping with a 'groups' list")
+    return data
+
+
+def _check(group: dict, where: str):
+    unknown = set(group) - GROUP_KEYS
+    if unknown:
+        raise ValueError(f"{where}: unknown keys {', '.join(sorted(unknown))}")
+    if not isinstance(group.get("count"), int) or group["count"] < 0:
+        raise ValueError(f"{where}: 'count' must be a non-negative integer")
+    if group.get("mode", "stream") not in MODES:
+        raise ValueError(f"{where}: 'mode' must be one of {', '.join(MODES)}")
+    size = group.get("page_size")
+    if size is not None and not (isinstance(size, int) and 1 <= size <= MAX_PAYLOAD):
+        raise ValueError(f"{where}: 'page_size' must be 1..{MAX_PAYLOAD} (3-byte frame length field)")
+    unknown = set(group.get("reconnect") or {}) - RECONNECT_KEYS
+    if unknown:
+        raise ValueError(f"{where}: unknown reconnect keys {', '.join(sorted(unknown))}")
+
+
+def load_groups(path: str | Path) -> list[dict]:
+    """Groups with `defaults:` applied and validated; keys still missing are left to the caller."""
+    data = read_scenario(path)
+    defaults = data.get("defaults") or {}
+    groups, names = [], set()
+    for n, raw in enumerate(data["groups"], start=1):
+        group = {**defaults, **raw,
+                 "reconnect": {**(defaults.get("reconnect") or {}), **(raw.get("reconnect") or {})}}
+        group.setdefault("name", f"group{n}")
+        _check(group, f"{path}: group {group['name']!r}")
+        if group["name"] in names:
+            raise ValueError(f"{path}: duplicate group name {group['name']!r}")
+        names.add(group["name"])
+        groups.append(group)
+    return groups
@@ -2,8 +2,9 @@ import time
 import asyncio
 import argparse
 import random
+import uuid
 from pathlib import Path
-from collections import deque
+from collections import deque, defaultdict
 from http import HTTPStatus
 
 import aiohttp
@@ -12,6 +13,29 @@ from rich.live import Live
 from rich.table import Table
 from rich.text import Text
 
+from metrics import (MetricsWriter, LatencyHistogram, add_metrics_args, open_metrics, rate,
+                     merged, fmt_percentiles)
+from ramp import add_ramp_args, run_ramp, print_ramp_report
+from loops import add_loop_args, loop_from_argv, run
+from report import add_report_args, build_report, ratio, save_report
+from synth import parse_spec, render
+
+# running totals for the metrics output
+totals = {"uploads": 0, "errors": 0, "bytes": 0, "in_flight": 0,
+          "waiting": 0,   # open-loop uploads that are due but waiting for an in-flight slot
+          # connection pool: connections opened / reused, requests that queued for a free one
+          "new_conns": 0, "reused_conns": 0, "pool_queued": 0}
+# per-listener latency: POST start → response headers, and → response fully read
+ttfb_lat: dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+upload_lat: dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+# POST start → connection ready (pool queueing, DNS and connect included)
+acquire_lat = LatencyHistogram()
+# for the end-of-run report: per-listener successes / failures, failures by kind
+succeeded: dict[str, int] = defaultdict(int)
+failed: dict[str, int] = defaultdict(int)
+error_kinds: dict[str, int] = defaultdict(int)     # exception name / "HTTP <status>" → count
+activated: dict[str, float] = {}                    # listener → monotonic time it started sending
+
 def format_status(code: int) -> Text:
     """
     Map an HTTP status code to a descriptive phrase and style:
@@ -35,6 +59,72 @@ def format_status(code: int) -> Text:
         style = "white"
     return Text(f"{code} {phrase}", style=style)
 
+class UploadBody:
+    """
+    Multipart/form-data body for one recording, built once and reused:
+      • the WAV bytes and closing boundary are shared by every send
+      • only the small part headers carrying listener_id / filename are
+        rendered per send
+    so an upload is sent straight from memory without re-reading the file.
+    """
+    def __init__(self, wav_bytes: bytes):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self.wav = memoryview(wav_bytes)
+        self.head_tpl = (
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="listener_id"\r\n\r\n'
+            "{listener_id}\r\n"
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            "Content-Type: audio/wav\r\n\r\n"
+        )
+        self.tail = f"\r\n--{boundary}--\r\n".encode()
+
+    def render(self, listener_id: str, filename: str) -> tuple[list, dict]:
+        """Return (body buffers, request headers) for one send."""
+        head = self.head_tpl.format(listener_id=listener_id, filename=filename).encode()
+        parts = [head, self.wav, self.tail]
+        headers = {"Content-Type": self.content_type,
+                   "Content-Length": str(sum(len(p) for p in parts))}
+        return parts, headers
+
+async def iter_parts(parts: list):
+    # with an explicit Content-Length aiohttp writes these as-is (no chunking, no join)
+    for part in parts:
+        yield part
+
+def pool_trace() -> aiohttp.TraceConfig:
+    """aiohttp hooks that time connection acquisition and count new vs. reused connections."""
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, ctx, params):
+        ctx.started = time.monotonic()
+
+    async def on_queued(session, ctx, params):
+        totals["pool_queued"] += 1
+
+    async def on_created(session, ctx, params):
+        totals["new_conns"] += 1
+        acquire_lat.record(time.monotonic() - ctx.started)
+
+    async def on_reused(session, ctx, params):
+        totals["reused_conns"] += 1
+        acquire_lat.record(time.monotonic() - ctx.started)
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_connection_queued_start.append(on_queued)
+    trace.on_connection_create_end.append(on_created)
+    trace.on_connection_reuseconn.append(on_reused)
+    return trace
+
+def make_connector(args: argparse.Namespace) -> aiohttp.TCPConnector:
+    """Connection pool from --pool-size / --pool-per-host / --keepalive / --dns-ttl."""
+    keepalive = {"force_close": True} if args.keepalive == 0 else {"keepalive_timeout": args.keepalive}
+    return aiohttp.TCPConnector(limit=args.pool_size, limit_per_host=args.pool_per_host,
+                                use_dns_cache=args.dns_ttl != 0, ttl_dns_cache=args.dns_ttl or None,
+                                **keepalive)
+
 async def producer(listener_id: str, interval: float, job_queue: asyncio.Queue):
     """
     Every `interval` seconds (after a random head-start), enqueue a job to send.
@@ -44,43 +134,114 @@ async def producer(listener_id: str, interval: float, job_queue: asyncio.Queue):
         await job_queue.put(listener_id)
         await asyncio.sleep(interval)
 
+async def send_upload(listener_id: str,
+                      upload_body: UploadBody,
+                      endpoint: str,
+                      session: aiohttp.ClientSession,
+                      history: deque,
+                      timestamps: deque,
+                      started: float,
+                      quiet: bool = False):
+    """
+    Do one HTTP POST and record the result. Latencies are measured from
+    `started` (time.monotonic), which open-loop mode sets to the intended start.
+    """
+    now = time.time()
+    ts_str = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(now))
+    filename = f"{listener_id}_{ts_str}.wav"
+
+    parts, headers = upload_body.render(listener_id, filename)
+
+    totals["in_flight"] += 1
+    try:
+        async with session.post(endpoint, data=iter_parts(parts), headers=headers) as resp:
+            ttfb_lat[listener_id].record(time.monotonic() - started)
+            await resp.read()
+            upload_lat[listener_id].record(time.monotonic() - started)
+            status_text = format_status(resp.status)
+            if not quiet:
+                print(status_text, flush=True)
+        totals["uploads"] += 1
+        totals["bytes"] += int(headers["Content-Length"])
+        if resp.status >= 400:
+            totals["errors"] += 1
+            failed[listener_id] += 1
+            error_kinds[f"HTTP {resp.status}"] += 1
+        else:
+            succeeded[listener_id] += 1
+    except Exception as e:
+        # on network or other exception, mark bold red
+        status_text = Text(f"ERR: {e}", style="bold red")
+        totals["errors"] += 1
+        failed[listener_id] += 1
+        error_kinds[type(e).__name__] += 1
+    finally:
+        totals["in_flight"] -= 1
+
+    # record for UI: store a Text object for rich styling
+    history.appendleft((listener_id, filename, status_text, ts_str))
+    timestamps.append(now)
+
 async def consumer(job_queue: asyncio.Queue,
-                   wav_path: Path,
+                   upload_body: UploadBody,
                    endpoint: str,
                    session: aiohttp.ClientSession,
                    history: deque,
-                   timestamps: deque):
+                   timestamps: deque,
+                   quiet: bool = False):
     """
     Pull jobs off the queue, do the HTTP POST, and record results.
     """
     while True:
         listener_id = await job_queue.get()
-        now = time.time()
-        ts_str = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(now))
-        filename = f"{listener_id}_{ts_str}.wav"
-
-        form = aiohttp.FormData()
-        form.add_field("listener_id", listener_id)
-        form.add_field(
-            "file",
-            wav_path.open("rb"),
-            filename=filename,
-            content_type="audio/wav"
-        )
+        await send_upload(listener_id, upload_body, endpoint, session, history, timestamps,
+                          time.monotonic(), quiet)
+        job_queue.task_done()
 
-        try:
-            async with session.post(endpoint, data=form) as resp:
-                status_text = format_status(resp.status)
-                print(status_text, flush=True)
-        except Exception as e:
-            # on network or other exception, mark bold red
-            status_text = Text(f"ERR: {e}", style="bold red")
+async def open_loop(rate_per_source: float,
+                    arrival: str,
+                    max_in_flight: int,
+                    active_ids: list[str],
+                    upload_body: UploadBody,
+                    endpoint: str,
+                    session: aiohttp.ClientSession,
+                    history: deque,
+                    timestamps: deque,
+                    quiet: bool = False):
+    """
+    Launch uploads at `rate_per_source` × active sources per second (fixed gaps
+    or Poisson arrivals), independent of how fast earlier ones complete. At
+    most `max_in_flight` run at once; the rest wait, and their latency still
+    counts from the moment they were due, so a slow server can't hide behind
+    fewer sends. `active_ids` may grow while running (ramp mode).
+    """
+    slots = asyncio.Semaphore(max_in_flight)
+    running = set()
+    launched = 0
 
-        # record for UI: store a Text object for rich styling
-        history.appendleft((listener_id, filename, status_text, ts_str))
-        timestamps.append(now)
+    async def launch(listener_id: str, intended: float):
+        totals["waiting"] += 1
+        async with slots:
+            totals["waiting"] -= 1
+            await send_upload(listener_id, upload_body, endpoint, session, history,
+                              timestamps, intended, quiet)
 
-        job_queue.task_done()
+    intended = time.monotonic()
+    while True:
+        rate = rate_per_source * len(active_ids)
+        if not rate:
+            await asyncio.sleep(0.25)
+            intended = time.monotonic()
+            continue
+        intended += random.expovariate(rate) if arrival == "poisson" else 1 / rate
+        delay = intended - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        listener_id = active_ids[launched % len(active_ids)]
+        launched += 1
+        task = asyncio.create_task(launch(listener_id, intended))
+        running.add(task)
+        task.add_done_callback(running.discard)
 
 async def ui_updater(history: deque,
                      timestamps: deque,
@@ -90,6 +251,7 @@ async def ui_updater(history: deque,
     Refresh a Rich Live display showing:
       • Throughput in last `interval` seconds  
       • Pending jobs in queue  
+      • TTFB / upload latency percentiles  
       • Last 20 sends
     """
     with Live(refresh_per_second=4, vertical_overflow="visible") as live:
@@ -99,7 +261,7 @@ async def ui_updater(history: deque,
             while timestamps and timestamps[0] < now - interval:
                 timestamps.popleft()
             sent_count = len(timestamps)
-            pending_count = job_queue.qsize()
+            pending_count = job_queue.qsize() + totals["waiting"]
 
             throughput = Text.assemble(
                 ("Throughput: ", "bold"),
@@ -111,6 +273,18 @@ async def ui_updater(history: deque,
                 (str(pending_count), "yellow"),
                 (" jobs\n", "")
             )
+            latency = Text.assemble(
+                ("TTFB:    ", "bold"),
+                (fmt_percentiles(merged(ttfb_lat.values())), "cyan"),
+                ("\nUpload:  ", "bold"),
+                (fmt_percentiles(merged(upload_lat.values())), "cyan"),
+                ("\nAcquire: ", "bold"),
+                (fmt_percentiles(acquire_lat), "cyan"),
+                ("\nConnections: ", "bold"),
+                (f"{totals['new_conns']} new, {totals['reused_conns']} reused, "
+                 f"{totals['pool_queued']} queued for the pool", "cyan"),
+                ("\n", "")
+            )
 
             table = Table(show_header=True, header_style="bold magenta")
             table.add_column("Listener", width=10)
@@ -121,9 +295,95 @@ async def ui_updater(history: deque,
                 # status_text is a Rich Text object with color/style
                 table.add_row(lid, fn, status_text, ts)
 
-            live.update(Group(throughput, pending, table))
+            live.update(Group(throughput, pending, latency, table))
             await asyncio.sleep(0.25)
 
+async def metrics_updater(writer: MetricsWriter,
+                          interval: float,
+                          job_queue: asyncio.Queue):
+    """
+    Every `interval` seconds write one row of aggregate upload metrics.
+    """
+    started = prev_t = time.monotonic()
+    prev_uploads = prev_bytes = 0
+    prev_ttfb, prev_upload, prev_acquire = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        ttfb = merged(ttfb_lat.values())
+        upload = merged(upload_lat.values())
+        writer.write({
+            "ts": round(time.time(), 3),
+            "elapsed_s": round(now - started, 3),
+            "uploads": totals["uploads"],
+            "uploads_per_s": rate(totals["uploads"], prev_uploads, now - prev_t),
+            "bytes": totals["bytes"],
+            "bytes_per_s": rate(totals["bytes"], prev_bytes, now - prev_t),
+            "in_flight": totals["in_flight"],
+            "pending": job_queue.qsize() + totals["waiting"],
+            "errors": totals["errors"],
+            "new_conns": totals["new_conns"],
+            "reused_conns": totals["reused_conns"],
+            "pool_queued": totals["pool_queued"],
+            # latency percentiles over this interval only
+            **ttfb.since(prev_ttfb).summary("ttfb_"),
+            **upload.since(prev_upload).summary("upload_"),
+            **acquire_lat.since(prev_acquire).summary("acquire_"),
+        })
+        prev_t, prev_uploads, prev_bytes = now, totals["uploads"], totals["bytes"]
+        prev_ttfb, prev_upload, prev_acquire = ttfb, upload, acquire_lat.copy()
+
+def totals_snapshot() -> dict:
+    return {**totals,
+            "ttfb_lat": merged(ttfb_lat.values()),
+            "upload_lat": merged(upload_lat.values()),
+            "acquire_lat": acquire_lat.copy()}
+
+def final_report(args: argparse.Namespace, listener_ids: list[str], started: float,
+                 elapsed: float, steps: list[dict]) -> dict:
+    """End-of-run report (see report.py); the target is one upload per --interval per listener
+    (closed loop) or --rate spread evenly over the listeners (open loop)."""
+    now = time.monotonic()
+    per_s = args.rate / args.num_sources if args.rate else 1 / args.interval if args.interval else 0.0
+    listeners = {}
+    due_total = 0.0
+    for lid in listener_ids:
+        due = (now - activated[lid]) * per_s if lid in activated else 0.0
+        due_total += due
+        listeners[lid] = {
+            "uploads": succeeded[lid], "errors": failed[lid], "rt_ratio": ratio(succeeded[lid], due),
+            "ttfb_p99_ms": round(ttfb_lat[lid].percentile(99) * 1000, 3),
+            "upload_p99_ms": round(upload_lat[lid].percentile(99) * 1000, 3),
+        }
+    report_totals = {
+        "listeners": len(listener_ids), "uploads": totals["uploads"], "bytes": totals["bytes"],
+        "bytes_per_s": rate(totals["bytes"], 0, elapsed),
+        "uploads_per_s": rate(totals["uploads"], 0, elapsed),
+        "rt_ratio": ratio(sum(succeeded.values()), due_total), "errors": totals["errors"],
+        "new_conns": totals["new_conns"], "reused_conns": totals["reused_conns"],
+        "pool_queued": totals["pool_queued"],
+    }
+    latency = {"ttfb": merged(ttfb_lat.values()), "upload": merged(upload_lat.values()),
+               "acquire": acquire_lat}
+    return build_report("stress_test", args, started, elapsed, report_totals, error_kinds,
+                        latency, listeners, steps)
+
+def measure_step(before: dict, after: dict, seconds: float, n: int) -> dict:
+    """
+    One ramp-step row: throughput, error rate and latency over the step.
+    """
+    uploads = after["uploads"] - before["uploads"]
+    errors = after["errors"] - before["errors"]
+    return {
+        "uploads_per_s": rate(after["uploads"], before["uploads"], seconds),
+        "bytes_per_s": rate(after["bytes"], before["bytes"], seconds),
+        "error_pct": round(errors / uploads * 100, 2) if uploads else (100.0 if errors else 0.0),
+        "ttfb_p99_ms": round(after["ttfb_lat"].since(before["ttfb_lat"]).percentile(99) * 1000, 2),
+        "p99_ms": round(after["upload_lat"].since(before["upload_lat"]).percentile(99) * 1000, 2),
+        "acquire_p99_ms": round(
+            after["acquire_lat"].since(before["acquire_lat"]).percentile(99) * 1000, 2),
+    }
+
 async def main():
     parser = argparse.ArgumentParser(
         description="Stress-test an HTTP endpoint with staggered uploads."
@@ -137,6 +397,12 @@ async def main():
                         help="Path to the recording to send",
                         type=str,
                         default="./wav_samples/sample.wav")
+    parser.add_argument("--synth",
+                        metavar="SPEC",
+                        help="Upload generated audio instead of --file, e.g. noise:duration=20 "
+                             "(see synth.py)",
+                        type=str,
+                        default=None)
     parser.add_argument("-n", "--num-sources",
                         type=int,
                         default=1,
@@ -149,16 +415,60 @@ async def main():
                         help="A full url to post to. this overrides the ip",
                         type=str,
                         default=None)
+    parser.add_argument("-r", "--rate",
+                        type=float,
+                        default=None,
+                        help="Open-loop mode: total uploads per second, launched "
+                             "regardless of completions (replaces --interval pacing)")
+    parser.add_argument("--arrival",
+                        choices=("poisson", "fixed"),
+                        default="poisson",
+                        help="Open-loop arrival process")
+    parser.add_argument("--max-in-flight",
+                        type=int,
+                        default=100,
+                        help="Open-loop cap on concurrent uploads")
+    parser.add_argument("--pool-size",
+                        type=int,
+                        default=100,
+                        help="Max open connections in the client pool (0 = unlimited); "
+                             "uploads beyond it queue inside the client")
+    parser.add_argument("--pool-per-host",
+                        type=int,
+                        default=0,
+                        help="Max open connections per host (0 = only --pool-size applies)")
+    parser.add_argument("--keepalive",
+                        type=float,
+                        default=15.0,
+                        help="Seconds an idle connection is kept for reuse (0 = new connection "
+                             "per upload)")
+    parser.add_argument("--dns-ttl",
+                        type=float,
+                        default=10.0,
+                        help="Seconds to cache DNS lookups (0 = resolve on every connect)")
+    add_loop_args(parser)
+    add_metrics_args(parser)
+    add_ramp_args(parser)
+    add_report_args(parser)
     args = parser.parse_args()
+    started_wall, started = time.time(), time.monotonic()
 
     endpoint = f"http://{args.ip}:8000/recordings_upload"
     if args.url:
         endpoint = args.url
 
-    wav_path = Path(args.file)
-    if not wav_path.is_file():
-        print("ERROR: file not found:", wav_path)
-        return
+    if args.synth:
+        try:
+            upload_body = UploadBody(render(parse_spec(args.synth)))
+        except ValueError as e:
+            print("ERROR:", e)
+            return
+    else:
+        wav_path = Path(args.file)
+        if not wav_path.is_file():
+            print("ERROR: file not found:", wav_path)
+            return
+        upload_body = UploadBody(wav_path.read_bytes())   # read once, reused by every send
 
     # shared state
     history = deque(maxlen=10)   # last 10 sends
@@ -167,29 +477,68 @@ async def main():
 
     listener_ids = [f"listener{id:02d}" for id in range(1, args.num_sources + 1)]
 
-    async with aiohttp.ClientSession() as session:
-        # start producers
-        producers = [
-            asyncio.create_task(producer(lid, args.interval, job_queue))
-            for lid in listener_ids
-        ]
-        # start one consumer per source
-        consumers = [
-            asyncio.create_task(
-                consumer(job_queue, wav_path, endpoint, session, history, timestamps)
-            )
-            for _ in listener_ids
-        ]
-        # start UI
-        ui_task = asyncio.create_task(ui_updater(history, timestamps, args.interval, job_queue))
+    async with aiohttp.ClientSession(connector=make_connector(args),
+                                     trace_configs=[pool_trace()]) as session:
+        active_ids = []   # sources currently sending (grows step by step in ramp mode)
+        tasks = []
+
+        def set_active(n: int):
+            for lid in listener_ids[len(active_ids):n]:
+                active_ids.append(lid)
+                activated[lid] = time.monotonic()
+                if args.rate:
+                    continue    # open loop picks its sources from active_ids
+                # start a producer and a consumer per source
+                tasks.append(asyncio.create_task(producer(lid, args.interval, job_queue)))
+                tasks.append(asyncio.create_task(
+                    consumer(job_queue, upload_body, endpoint, session, history, timestamps,
+                             quiet=args.headless)
+                ))
+
+        if args.rate:
+            # open loop: one scheduler, no per-source producer/consumer pairs
+            tasks.append(asyncio.create_task(
+                open_loop(args.rate / args.num_sources, args.arrival, args.max_in_flight,
+                          active_ids, upload_body, endpoint, session, history, timestamps,
+                          quiet=args.headless)
+            ))
+        if not args.ramp_step:
+            set_active(args.num_sources)
+
+        # start UI and/or metrics output
+        ui_tasks = []
+        if not args.headless:
+            ui_tasks.append(asyncio.create_task(
+                ui_updater(history, timestamps, args.interval, job_queue)))
+        writer = open_metrics(args)
+        if writer:
+            ui_tasks.append(asyncio.create_task(
+                metrics_updater(writer, args.metrics_interval, job_queue)))
 
+        results = []
         try:
-            await asyncio.gather(*producers, *consumers, ui_task)
+            if args.ramp_step:
+                results = await run_ramp(
+                    args.num_sources, args.ramp_step, args.ramp_hold, args.ramp_settle,
+                    set_active, totals_snapshot, measure_step,
+                    {"p99_ms": args.slo_p99_ms, "error_pct": args.slo_error_pct},
+                    on_step=writer.write_step if writer else None)
+            else:
+                await asyncio.gather(*tasks, *ui_tasks)
         except asyncio.CancelledError:
             pass
+        finally:
+            for task in tasks + ui_tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, *ui_tasks, return_exceptions=True)
+            if writer:
+                writer.close()
+    save_report(final_report(args, listener_ids, started_wall, time.monotonic() - started, results),
+                args)
+    print_ramp_report(results, plain=args.headless)
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run(main(), loop_from_argv())
     except KeyboardInterrupt:
         print("Stopped by user")
@@ -1,6 +1,8 @@
-import argparse, asyncio, struct, time, wave, random, sys
+import argparse, asyncio, time, wave, random, sys, queue, math, mmap, zlib
+import multiprocessing as mp
 from pathlib import Path
-from collections import deque
+from typing import Callable
+from collections import deque, namedtuple
 from http import HTTPStatus
 import aiohttp
 from rich.console import Group
@@ -8,12 +10,117 @@ from rich.live import Live
 from rich.table import Table
 from rich.text import Text
 from rich.progress import Progress, BarColumn, TaskProgressColumn, TimeElapsedColumn
+from metrics import (MetricsWriter, LatencyHistogram, add_metrics_args, open_metrics, rate,
+                     merged, fmt_percentiles)
+from ramp import add_ramp_args, run_ramp, print_ramp_report, run_sweep, print_sweep_report
+from loops import add_loop_args, loop_from_argv, run
+from report import add_report_args, build_report, ratio, save_report
+from frame_protocol import MAX_PAYLOAD, frame_header, meta_frame, next_seq, page_seq
+from raw_http import RawSession
+from h2_transport import H2Session
+from scenario import load_groups
+from stress_test import UploadBody, iter_parts
+from synth import Synth, parse_spec, render
 
-PAGE = 32_768            # 32 KiB payload per frame
-SEQ_META = 0xFFFFFF       # reserved for future metadata frames
+PAGE = 32_768            # default payload per frame (32 KiB, --page-size)
+HIST_LEN = 20             # rows kept in the status table
+REPORT_EVERY = 0.25       # worker → parent snapshot cadence (matches dashboard refresh)
+PACER_TICK = 0.005        # timer-wheel resolution for page release
+BACKOFF_BASE = 1.0        # seconds; scale of the reconnect backoff
+
+
+class ListenerStats:
+    """Raw per-listener counters. The send path only bumps these; the dashboard formats them."""
+    COUNTERS = ("files", "pages", "bytes", "seconds", "file_no", "file_page", "file_pages",
+                "lag", "lag_max", "connected", "errors", "resumes", "bytes_avoided",
+                "reconnects", "down_since", "last_down", "up_at", "throttled",
+                "started", "idle", "idle_since")
+    HISTOGRAMS = ("connect_lat", "frame_lat", "upload_lat", "lag_hist", "reconnect_lat")
+    __slots__ = COUNTERS + HISTOGRAMS + ("error_kinds",)
+
+    def __init__(self):
+        self.files = 0          # completed files
+        self.pages = 0          # PCM pages sent, all files
+        self.bytes = 0          # PCM bytes sent, all files
+        self.seconds = 0.0      # audio seconds sent
+        self.file_no = 0        # header frames sent (file starts, incl. restarts)
+        self.file_page = 0      # pages sent of the current file
+        self.file_pages = 1     # pages in the current file
+        self.lag = 0.0          # last page release lag vs. its deadline (s)
+        self.lag_max = 0.0      # worst lag seen so far (s)
+        self.connected = False  # body currently being streamed
+        self.errors = 0         # failed / dropped connections and HTTP error responses
+        self.resumes = 0        # reconnects that continued the file instead of restarting it
+        self.bytes_avoided = 0  # PCM bytes those resumes did not send again
+        self.reconnects = 0     # connections re-established after a drop
+        self.down_since = 0.0   # monotonic time the connection dropped; 0 while up
+        self.last_down = 0.0    # start of the most recent outage
+        self.up_at = 0.0        # end of the most recent outage
+        self.throttled = 0.0    # seconds spent waiting on the reconnect limiter
+        self.started = 0.0      # monotonic time the listener began (after its stagger)
+        self.idle = 0.0         # seconds spent in --interval waits, which have no audio target
+        self.idle_since = 0.0   # start of the wait under way; 0 when not waiting
+        self.error_kinds: dict[str, int] = {}   # exception name / "HTTP <status>" → count
+        self.connect_lat = LatencyHistogram()  # POST start → first frame handed to aiohttp
+        self.frame_lat = LatencyHistogram()    # time aiohttp takes to write (and drain) a frame
+        self.upload_lat = LatencyHistogram()   # full duration of each long-lived POST
+        self.lag_hist = LatencyHistogram()     # page release lag vs. deadline
+        self.reconnect_lat = LatencyHistogram()  # connection drop → streaming again
+
+    def mark_down(self):
+        """The connection dropped or failed; an outage already under way keeps its start."""
+        self.connected = False
+        if not self.down_since:
+            self.down_since = self.last_down = time.monotonic()
+
+    def mark_up(self, now: float):
+        self.connected = True
+        if self.down_since:
+            self.reconnect_lat.record(now - self.down_since)
+            self.reconnects += 1
+            self.up_at, self.down_since = now, 0.0
+
+    def error(self, kind: str):
+        self.errors += 1
+        self.error_kinds[kind] = self.error_kinds.get(kind, 0) + 1
+
+    def take_report(self) -> tuple[tuple, dict, dict]:
+        """
+        Counters, error kinds and the histograms recorded since the last report,
+        for a worker to ship to the parent. The histograms are handed over and
+        replaced with empty ones, which is O(1) however many buckets they hold.
+        """
+        fresh = {}
+        for name in self.HISTOGRAMS:
+            hist = getattr(self, name)
+            if hist.count:
+                fresh[name] = hist
+                setattr(self, name, LatencyHistogram())
+        return tuple(getattr(self, name) for name in self.COUNTERS), dict(self.error_kinds), fresh
+
+    def apply_report(self, counters: tuple, error_kinds: dict, fresh: dict):
+        """Parent side of take_report(): overwrite the counters, add the new samples."""
+        for name, value in zip(self.COUNTERS, counters):
+            setattr(self, name, value)
+        self.error_kinds = error_kinds
+        for name, hist in fresh.items():
+            getattr(self, name).merge(hist)
+
+    def target_s(self, now: float) -> float:
+        """Seconds this listener should have spent streaming so far."""
+        if not self.started:
+            return 0.0
+        idle = self.idle + (now - self.idle_since if self.idle_since else 0.0)
+        return now - self.started - idle
+
+stats: dict[str, ListenerStats] = {}
+h2_sessions: list[H2Session] = []       # this process's --transport h2 sessions
+h2_shards: dict[str, tuple[int, int, int]] = {}    # worker name → h2_counts() there
+
+# one listener's settings, from the command line or a scenario group (picklable for workers)
+ListenerSpec = namedtuple("ListenerSpec", "lid mode source page_size interval stagger jitter url "
+                                          "max_delay max_attempts")
 
-files_sent: dict[str, int] = {}
-seconds_sent: dict[str, float] = {}
 
 # ─────────────────────────────────────────────────────────────────────────────
 def fmt_status(code: int) -> Text:
@@ -24,110 +131,476 @@ def fmt_status(code: int) -> Text:
     phrase = HTTPStatus(code).phrase if code in HTTPStatus._value2member_map_ else ""
     return Text(f"{code} {phrase}", style=colour)
 
-def make_frame(seq: int, payload: bytes) -> bytes:
-    """Return 6-byte frame header + payload."""
-    seq_bytes = struct.pack("<I", seq)[:3]  # 3 bytes for sequence
-    payload_len = len(payload)
-    # Pack payload length as 3 bytes (little endian)
-    len_bytes = struct.pack("<I", payload_len)[:3]  # 3 bytes for length
-    return seq_bytes + len_bytes + payload
+def fmt_hms(seconds: float) -> str:
+    mins, secs = divmod(int(seconds), 60)
+    hours, mins = divmod(mins, 60)
+    return f"{hours:02d}:{mins:02d}:{secs:02d}" if hours else f"{mins:02d}:{secs:02d}"
+
+def fmt_lag(seconds: float) -> str:
+    return f"{seconds * 1000:5.0f}ms"
 # ─────────────────────────────────────────────────────────────────────────────
 
 
-def split_wav(wav_bytes: bytes) -> tuple[bytes, memoryview]:
+def split_wav(wav_bytes: bytes | mmap.mmap) -> tuple[bytes, memoryview]:
     """
     Return (full_header, pcm_view).
     Header ≡ everything up through `"data"` + 4-byte size field.
+    The PCM view points into `wav_bytes` (no copy), so it also works on an mmap.
     """
     idx = wav_bytes.find(b"data")
     if idx < 0:
         raise ValueError("no 'data' tag found in WAV")
     header_end = idx + 8           # include 'data' + size field
-    return wav_bytes[:header_end], memoryview(wav_bytes[header_end:])
+    return bytes(wav_bytes[:header_end]), memoryview(wav_bytes)[header_end:]
+
+
+def map_file(path: Path) -> mmap.mmap:
+    with open(path, "rb") as fh:
+        return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def load_wav(wav_path: Path) -> tuple[bytes, memoryview, int]:
+    """
+    Return (full_header, pcm_view, bytes_per_sec) for a WAV file.
+    The file is memory-mapped read-only, so every listener – and every worker
+    process – streams from the same page-cache pages instead of private copies.
+    """
+    full_header, pcm = split_wav(map_file(wav_path))   # the view keeps the mapping alive
+    # pacing derived from the fmt chunk (via wave module)
+    with wave.open(str(wav_path), "rb") as wf:
+        rate, chans, width = wf.getframerate(), wf.getnchannels(), wf.getsampwidth()
+    return full_header, pcm, rate * chans * width
+
+
+def wav_rate(wav_path: Path) -> int:
+    """Parse `wav_path` the way a listener will (so a bad file fails at startup); its sample rate."""
+    try:
+        load_wav(wav_path)
+        with wave.open(str(wav_path), "rb") as wf:
+            return wf.getframerate()
+    except (wave.Error, EOFError, ValueError) as e:
+        raise ValueError(f"{wav_path}: not a usable WAV file ({e})") from None
+
+
+def build_frames(full_header: bytes, pcm: memoryview,
+                 page_size: int = PAGE) -> list[tuple[bytes, memoryview]]:
+    """
+    Precompute every frame of one file as (6-byte header, payload view).
+    Entry 0 is the WAV header frame, entry k the k-th PCM page. Seq only depends
+    on the page index, so the table is built once and shared by all listeners;
+    the payloads are slices of `pcm`, never copies.
+    """
+    frames = [(frame_header(0, len(full_header)), memoryview(full_header))]
+    for page, off in enumerate(range(0, len(pcm), page_size), start=1):
+        payload = pcm[off:off + page_size]
+        frames.append((frame_header(page_seq(page), len(payload)), payload))
+    return frames
+
+
+class WavSource:
+    """
+    One mapped WAV file, or one rendered synthetic file; frame tables are built
+    per page size on first use and shared.
+    """
+
+    def __init__(self, source: Path | Synth, with_crc: bool = False):
+        if isinstance(source, Synth):
+            self.data = render(source)
+            self.header, self.pcm = split_wav(self.data)
+            self.bytes_per_sec = source.bytes_per_sec
+        else:
+            self.header, self.pcm, self.bytes_per_sec = load_wav(source)
+            self.data = self.pcm.obj        # the whole mapping, for uploads
+        self.crc = zlib.crc32(self.pcm) if with_crc else 0
+        self.tables: dict[int, list[tuple[bytes, memoryview]]] = {}
+
+    def frames(self, page_size: int) -> list[tuple[bytes, memoryview]]:
+        table = self.tables.get(page_size)
+        if table is None:
+            table = self.tables[page_size] = build_frames(self.header, self.pcm, page_size)
+        return table
+
+
+def build_specs(args: argparse.Namespace) -> list[ListenerSpec]:
+    """
+    One spec per listener: a single group from the flags, or the groups of
+    --scenario (keys a group leaves out fall back to the flags). Groups are
+    interleaved in proportion to their size, so the first listeners a ramp
+    starts are a scaled-down copy of the whole fleet.
+    """
+    cli = {"name": "listener", "count": args.num_sources, "mode": "stream",
+           "interval": args.interval, "stagger": args.stagger, "jitter": args.jitter,
+           "url": args.url, "reconnect": {}}
+    groups = load_groups(args.scenario) if args.scenario else [cli]
+    rates: dict[Path | Synth, int] = {}
+    order = []
+    for g_no, group in enumerate(groups):
+        g = {**cli, **group}
+        name = g["name"]
+        if group.keys() & {"file", "corpus", "synth"}:
+            paths = wav_sources(group.get("file", args.file), group.get("corpus"), group.get("synth"))
+        else:
+            paths = wav_sources(args.file, args.corpus, args.synth)
+        for path in paths:
+            if path not in rates:
+                rates[path] = path.rate if isinstance(path, Synth) else wav_rate(path)
+            if g.get("sample_rate") and rates[path] != g["sample_rate"]:
+                raise ValueError(f"group {name!r}: {path} is {rates[path]} Hz, "
+                                 f"not {g['sample_rate']} Hz")
+        count = g["count"]
+        for i in range(count):
+            spec = ListenerSpec(
+                lid=f"{name}{i + 1:02d}", mode=g["mode"],
+                source=paths[assign_source(i, len(paths), args)],
+                page_size=g.get("page_size") or args.page_size[i % len(args.page_size)],
+                interval=g["interval"], stagger=g["stagger"], jitter=g["jitter"], url=g["url"],
+                max_delay=g["reconnect"].get("max_delay", 60),
+                max_attempts=g["reconnect"].get("max_attempts", 0))
+            order.append(((i + 0.5) / count, g_no, spec))
+    order.sort(key=lambda entry: entry[:2])
+    return [spec for _, _, spec in order]
+
+
+def page_sizes(text: str) -> list[int]:
+    """argparse type: comma-separated page sizes, each within the 3-byte length field."""
+    try:
+        sizes = [int(part) for part in text.split(",") if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a list of integers: {text!r}")
+    for size in sizes:
+        if not 1 <= size <= MAX_PAYLOAD:
+            raise argparse.ArgumentTypeError(
+                f"page size {size} outside 1..{MAX_PAYLOAD} (3-byte frame length field)")
+    if not sizes:
+        raise argparse.ArgumentTypeError("no page size given")
+    return sizes
+
+
+def wav_sources(file: str, corpus: str | None, synth: str | None = None) -> list[Path | Synth]:
+    """The WAV files a group streams: a synthetic one, every *.wav in `corpus`, else just `file`."""
+    if synth:
+        return [parse_spec(synth)]
+    if not corpus:
+        if not Path(file).exists():
+            raise ValueError(f"WAV not found: {file}")
+        return [Path(file)]
+    if not Path(corpus).is_dir():
+        raise ValueError(f"Corpus directory not found: {corpus}")
+    paths = sorted(p for p in Path(corpus).iterdir()
+                   if p.is_file() and p.suffix.lower() == ".wav")
+    if not paths:
+        raise ValueError(f"No .wav files in corpus: {corpus}")
+    return paths
+
+
+def assign_source(idx: int, n_sources: int, args: argparse.Namespace) -> int:
+    """
+    Which source listener `idx` streams. Depends only on the global index (and
+    seed), so every worker process arrives at the same assignment.
+    """
+    if args.assign == "random":
+        return random.Random(args.seed * 1_000_003 + idx).randrange(n_sources)
+    return idx % n_sources
+
+
+class Pacer:
+    """
+    Shared page-release clock for every streamer on one event loop.
+
+    Listeners park on absolute deadlines (file start + seq * page_dur) in a hashed
+    timer wheel; a single task sweeps the wheel every `tick` seconds and wakes
+    whatever is due. Lateness never accumulates because deadlines are absolute.
+    """
+
+    def __init__(self, tick: float = PACER_TICK, slots: int = 1024):
+        self.tick = tick
+        self.wheel: list[list[tuple[int, asyncio.Future]]] = [[] for _ in range(slots)]
+        self.cursor = int(time.monotonic() / tick)
+
+    async def wait_until(self, deadline: float) -> float:
+        """Sleep until `deadline` (time.monotonic clock); return release lag in seconds."""
+        now = time.monotonic()
+        if deadline > now:
+            # never release early, and never land in a slot the sweeper already passed
+            tick_idx = max(math.ceil(deadline / self.tick), self.cursor + 1)
+            fut = asyncio.get_running_loop().create_future()
+            self.wheel[tick_idx % len(self.wheel)].append((tick_idx, fut))
+            await fut
+            now = time.monotonic()
+        return max(0.0, now - deadline)
+
+    async def run(self):
+        slots = len(self.wheel)
+        while True:
+            await asyncio.sleep(self.tick)
+            now_idx = int(time.monotonic() / self.tick)
+            # sweep every slot passed since the last wake-up (at most one lap)
+            for tick_idx in range(max(self.cursor + 1, now_idx - slots + 1), now_idx + 1):
+                bucket = self.wheel[tick_idx % slots]
+                if not bucket:
+                    continue
+                pending = []
+                for due_idx, fut in bucket:
+                    if due_idx > now_idx:
+                        pending.append((due_idx, fut))    # due on a later lap
+                    elif not fut.done():
+                        fut.set_result(None)
+                self.wheel[tick_idx % slots] = pending
+            self.cursor = now_idx
+
+
+class StreamRejected(Exception):
+    """The server answered a stream POST with an HTTP error; retried like a dropped connection."""
+
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+def backoff_delay(mode: str, attempt: int, prev: float, cap: float) -> float:
+    """
+    Seconds to wait before reconnect attempt `attempt` (1-based). "fixed" doubles
+    per attempt, so listeners dropped together retry together; "full" jitter is
+    uniform in [0, fixed]; "decorrelated" is uniform in [base, 3 × `prev`].
+    All are capped at `cap`.
+    """
+    if mode == "decorrelated":
+        return min(cap, random.uniform(BACKOFF_BASE, max(prev, BACKOFF_BASE) * 3))
+    delay = min(cap, BACKOFF_BASE * 2 ** attempt)
+    return random.uniform(0, delay) if mode == "full" else delay
+
+
+class TokenBucket:
+    """
+    Reconnect limiter shared by every streamer on one event loop: `rate`
+    attempts per second with bursts of up to `burst`. Each acquire reserves a
+    token, possibly one refilled in the future, so waiters go in arrival order.
+    """
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate, self.burst = rate, max(burst, 1.0)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+
+    async def acquire(self) -> float:
+        """Wait for a token; returns the seconds waited."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class RecoveryTracker:
+    """
+    Time to full recovery of reconnect storms, from the listeners' outage
+    timestamps (one monotonic clock, so worker snapshots compare too). A storm
+    lasts from the first drop until no listener is down any more; overlapping
+    outages merge into one storm.
+    """
+
+    def __init__(self):
+        self.hist = LatencyHistogram()
+        self.start = None
+        self.end = 0.0
+        self.seen: dict[str, int] = {}      # reconnects per listener at the last update
+
+    def update(self, listeners: dict[str, "ListenerStats"]):
+        down = False
+        for lid, st in listeners.items():
+            if st.down_since:
+                down = True
+                self.start = min(self.start or st.down_since, st.down_since)
+            if st.reconnects != self.seen.get(lid, 0):
+                # came back since the last update, maybe after a drop this tracker never saw
+                self.seen[lid] = st.reconnects
+                self.start = min(self.start or st.last_down, st.last_down)
+                self.end = max(self.end, st.up_at)
+        if not down and self.start is not None:
+            self.hist.record(max(0.0, self.end - self.start))
+            self.start, self.end = None, 0.0
+
+
+recovery = RecoveryTracker()
+
+
+def h2_counts() -> tuple[int, int, int]:
+    """HTTP/2 connections (opened so far, open now, peak) across this process and its workers."""
+    local = [(s.connections_opened, s.connections_open, s.connections_peak) for s in h2_sessions]
+    return tuple(sum(col) for col in zip((0, 0, 0), *local, *h2_shards.values()))
+
+
+def h2_fields(connected: int) -> dict:
+    opened, now, _ = h2_counts()
+    return {"h2_conns": now, "h2_conns_opened": opened,
+            "listeners_per_h2_conn": round(connected / now, 1) if now else 0.0}
+
+
+async def resume_point(mode: str, sent_pages: int, endpoint: str, listener_id: str,
+                       control: aiohttp.ClientSession | None) -> int:
+    """
+    Page to continue the interrupted file after. "local" trusts what this side
+    sent, so pages lost in flight show up as missing_pages on the server;
+    "server" asks (GET on the stream URL → {"page": n}) and falls back to
+    restarting the file if the server can't say.
+    """
+    if mode == "local":
+        return sent_pages
+    try:
+        async with control.get(f"{endpoint}?listener_id={listener_id}") as resp:
+            if resp.status != 200:
+                return 0
+            return min(int((await resp.json())["page"]), sent_pages)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError, TypeError):
+        return 0
+
+
+def interval_wait(interval_s: float, jitter_s: float) -> float:
+    """One wait between files: `interval_s` ± up to `jitter_s`, never negative."""
+    if not jitter_s:
+        return interval_s
+    return max(0.0, interval_s + random.uniform(-jitter_s, jitter_s))
 
 
 async def streamer(listener_id: str,
-                   full_header: bytes,
-                   pcm: memoryview,
-                   page_dur: float,
+                   source: WavSource,
+                   page_size: Callable[[], int],
                    interval_s: float,
                    stagger_s: float,
+                   jitter_s: float,
                    endpoint: str,
-                   bytes_per_sec: int,
-                   progress: Progress,
-                   task_id: int,
                    dashboard_hist: deque,
-                   session: aiohttp.ClientSession):
-    """Maintain one long-lived HTTP POST; restart seq=0 after each interval. Auto-reconnect on failure."""
+                   session: aiohttp.ClientSession,
+                   pacer: Pacer,
+                   meta_every: int = 0,
+                   max_retry_delay: float = 60,
+                   max_attempts: int = 0,
+                   resume: str = "off",
+                   control: aiohttp.ClientSession | None = None,
+                   backoff: str = "full",
+                   limiter: TokenBucket | None = None):
+    """
+    Maintain one long-lived HTTP POST; restart seq=0 after each interval (varied by
+    ±`jitter_s`, see interval_wait()). Auto-reconnect on failure
+    (`backoff` mode capped at `max_retry_delay`, see backoff_delay(); give up after `max_attempts`
+    failures in a row, 0 = never). The row of failures ends once a connection streams its
+    first page (the response itself only arrives when the stream ends). Every reconnect first takes a token from `limiter`, if any.
+    `page_size()` is read at every file start; if it changes mid-file (page sweep) the
+    file is restarted at the new size.
+    With `meta_every` > 0, a SEQ_META tick frame follows every `meta_every` pages and a
+    file_end frame (page count + CRC-32 of the PCM) follows each file.
+    A connection lost mid-file restarts the file, unless `resume` is "local" (continue
+    after the last page handed to the transport) or "server" (continue after the last
+    page the server reports, asked over `control`); see resume_point().
+    """
     if stagger_s > 0:
         await asyncio.sleep(random.uniform(0, stagger_s))
 
-    total_pages = (len(pcm) + PAGE - 1) // PAGE
+    st = stats[listener_id]
+    st.started = time.monotonic()
+    bytes_per_sec = source.bytes_per_sec
     retry_count = 0
-    max_retry_delay = 60  # Maximum delay between retries (seconds)
+    retry_delay = BACKOFF_BASE
+    posted = False
     
     # State variables to track streaming progress
-    current_offset = 0
     current_seq = 0
-    in_interval_wait = False
-    interval_wait_remaining = 0
+    sent_pages = 0          # pages of the current file handed to the transport
+    sent_size = 0           # page size of the current file
+    resume_page = 0         # the next connection continues the file after this page
     
     while True:  # Outer retry loop
         try:
             async def body_gen():
-                nonlocal current_offset, current_seq, in_interval_wait, interval_wait_remaining
-                
-                # If we were in the middle of waiting between files, complete the wait
-                if in_interval_wait and interval_wait_remaining > 0:
-                    await asyncio.sleep(interval_wait_remaining)
-                    in_interval_wait = False
-                    interval_wait_remaining = 0
-                
+                nonlocal current_seq, sent_pages, sent_size, resume_page, retry_count, retry_delay
+                now = time.monotonic()
+                st.mark_up(now)
+                st.connect_lat.record(now - post_start)
+
                 while True:
                     # 1) header frame - start new file
-                    yield make_frame(0, full_header)
-                    current_seq = 1
-                    current_offset = 0
-                    progress.reset(task_id, total=total_pages, completed=0)
-
-                    # 2) PCM pages
-                    while current_offset < len(pcm):
-                        payload = pcm[current_offset:current_offset + PAGE]
-                        yield make_frame(current_seq, payload)
-                        current_seq = (current_seq + 1) & 0xFFFFFF
-                        current_offset += PAGE
-                        progress.update(task_id, advance=1)
-
-                        # ─── live totals ────────────────────────────────────────────────
-                        seconds_sent[listener_id] += min(PAGE, len(payload)) / bytes_per_sec
-                        mins, secs = divmod(int(seconds_sent[listener_id]), 60)
-                        hours, mins = divmod(mins, 60)
-                        hms = f"{hours:02d}:{mins:02d}:{secs:02d}" if hours else f"{mins:02d}:{secs:02d}"
-                        progress.update(task_id, time=hms)
-
-                        await asyncio.sleep(page_dur)
-
-                    # 3) file finished ────── update dashboard + counters ─────────
-                    dashboard_hist.appendleft(
-                        (listener_id, Text("DONE", style="green"),
-                         time.strftime("%H:%M:%S", time.gmtime()))
-                    )
-
-                    files_sent[listener_id] += 1
-                    mins, secs = divmod(int(seconds_sent[listener_id]), 60)
-                    hours, mins = divmod(mins, 60)
-                    hms = f"{hours:02d}:{mins:02d}:{secs:02d}" if hours else f"{mins:02d}:{secs:02d}"
-
-                    progress.update(task_id,
-                                    files=files_sent[listener_id],
-                                    time=hms)
-
-                    # 4) wait for next cycle
-                    in_interval_wait = True
-                    interval_wait_start = time.time()
-                    await asyncio.sleep(interval_s)
-                    in_interval_wait = False
-                    interval_wait_remaining = 0
+                    size = page_size()
+                    frames = source.frames(size)
+                    page_dur = size / bytes_per_sec
+                    total_pages = len(frames) - 1
+                    hdr, payload = frames[0]
+                    yield hdr
+                    yield payload
+                    done = resume_page if size == sent_size else 0
+                    resume_page = 0
+                    if done:
+                        yield meta_frame({"type": "resume", "t": time.time(), "page": done})
+                        st.resumes += 1
+                        st.bytes_avoided += min(done * size, len(source.pcm))
+                    current_seq = page_seq(done + 1)
+                    sent_pages, sent_size = done, size
+                    # deadlines continue from now rather than catching up on the outage
+                    file_start = time.monotonic() - done * page_dur
+                    st.file_no += 1
+                    st.file_page = done
+                    st.file_pages = total_pages
+
+                    # 2) PCM pages – header and payload go out as separate buffers,
+                    #    so nothing is concatenated or copied per listener
+                    for page in range(done + 1, len(frames)):
+                        hdr, payload = frames[page]
+                        t_write = time.monotonic()
+                        yield hdr
+                        yield payload
+                        st.frame_lat.record(time.monotonic() - t_write)
+                        sent_pages = page
+                        current_seq = next_seq(current_seq)
+
+                        # ─── live totals (formatted by the dashboard, not here) ──────────
+                        st.file_page = page
+                        st.pages += 1
+                        st.bytes += len(payload)
+                        st.seconds += len(payload) / bytes_per_sec
+
+                        if meta_every and page % meta_every == 0:
+                            yield meta_frame({"type": "tick", "t": time.time(),
+                                              "seq": current_seq, "pages": st.pages,
+                                              "bytes": st.bytes,
+                                              "lag_ms": round(st.lag * 1000, 1)})
+
+                        # next page is due one page-duration after this one, measured
+                        # from the file start so framing/loop overhead can't drift
+                        lag = await pacer.wait_until(file_start + page * page_dur)
+                        if retry_count:
+                            # a page went out and its slot passed without the server refusing
+                            # the POST: streaming again, so the next drop is failure no. 1
+                            retry_count = 0
+                            retry_delay = BACKOFF_BASE
+                        st.lag = lag
+                        st.lag_hist.record(lag)
+                        if lag > st.lag_max:
+                            st.lag_max = lag
+                        if page_size() != size:
+                            break       # page sweep moved on: restart the file at the new size
+                    else:
+                        # 3) file finished ────── update dashboard + counters ─────────
+                        if meta_every:
+                            yield meta_frame({"type": "file_end", "t": time.time(),
+                                              "pages": total_pages, "crc32": source.crc})
+                        dashboard_hist.appendleft(
+                            (listener_id, Text("DONE", style="green"),
+                             time.strftime("%H:%M:%S", time.gmtime()))
+                        )
+
+                        st.files += 1
+                        sent_pages = 0
+
+                        # 4) wait for next cycle
+                        st.idle_since = time.monotonic()
+                        try:
+                            await asyncio.sleep(interval_wait(interval_s, jitter_s))
+                        finally:
+                            st.idle += time.monotonic() - st.idle_since
+                            st.idle_since = 0.0
 
             # Try to establish connection and stream
             start_ts = time.strftime("%H:%M:%S", time.gmtime())
@@ -139,22 +612,41 @@ async def streamer(listener_id: str,
                      time.strftime("%H:%M:%S", time.gmtime()))
                 )
             
+            if limiter and posted:
+                st.throttled += await limiter.acquire()
+            posted = True
+            if resume != "off" and sent_pages:
+                resume_page = await resume_point(resume, sent_pages, endpoint, listener_id, control)
+            post_start = time.monotonic()
             async with session.post(f"{endpoint}?listener_id={listener_id}",
                                     data=body_gen()) as resp:
-                # Connection successful, reset retry count
-                retry_count = 0
                 dashboard_hist.appendleft((listener_id, fmt_status(resp.status), start_ts))
-                
-                # If we get a successful connection, stream until connection closes
+                # the response only arrives once the stream ends (or is refused)
                 await resp.text()
                 await resp.wait_for_close()
-                
-        except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
-            # Connection failed or was lost
+            st.upload_lat.record(time.monotonic() - post_start)
+            if resp.status >= 400:
+                raise StreamRejected(resp.status)
+            if 200 <= resp.status < 300:
+                retry_count = 0
+                retry_delay = BACKOFF_BASE
+            st.mark_down()
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, StreamRejected) as e:
+            # Connection failed, was lost or was refused
+            error_msg = str(e) if isinstance(e, StreamRejected) else type(e).__name__
+            st.mark_down()
+            st.error(error_msg)
             retry_count += 1
-            retry_delay = min(2 ** retry_count, max_retry_delay)  # Exponential backoff
+            if max_attempts and retry_count > max_attempts:
+                st.down_since = 0.0     # out of the recovery tracking for good
+                dashboard_hist.appendleft(
+                    (listener_id, Text(f"GAVE UP after {max_attempts}", style="red"),
+                     time.strftime("%H:%M:%S", time.gmtime()))
+                )
+                return
+            retry_delay = backoff_delay(backoff, retry_count, retry_delay, max_retry_delay)
             
-            error_msg = type(e).__name__
             if hasattr(e, 'message'):
                 error_msg = f"{error_msg}: {e.message}"
             
@@ -164,7 +656,7 @@ async def streamer(listener_id: str,
             )
             
             dashboard_hist.appendleft(
-                (listener_id, Text(f"Retry in {retry_delay}s", style="orange"),
+                (listener_id, Text(f"Retry in {retry_delay:.1f}s", style="orange"),
                  time.strftime("%H:%M:%S", time.gmtime()))
             )
             
@@ -172,6 +664,8 @@ async def streamer(listener_id: str,
             
         except Exception as e:
             # Unexpected error - log it but keep trying
+            st.mark_down()
+            st.error(type(e).__name__)
             dashboard_hist.appendleft(
                 (listener_id, Text(f"UNEXPECTED: {type(e).__name__}", style="bright_red"),
                  time.strftime("%H:%M:%S", time.gmtime()))
@@ -179,9 +673,86 @@ async def streamer(listener_id: str,
             await asyncio.sleep(5)  # Brief pause before retry
 
 
-async def dashboard_updater(history: deque, progress: Progress):
+async def uploader(listener_id: str,
+                   body: UploadBody,
+                   bytes_per_sec: int,
+                   interval_s: float,
+                   stagger_s: float,
+                   jitter_s: float,
+                   endpoint: str,
+                   dashboard_hist: deque,
+                   session: aiohttp.ClientSession):
+    """Scenario `mode: upload`: POST the whole file as multipart, then wait `interval_s` (± `jitter_s`), forever."""
+    if stagger_s > 0:
+        await asyncio.sleep(random.uniform(0, stagger_s))
+
+    st = stats[listener_id]
+    st.started = time.monotonic()
+    audio_s = len(body.wav) / bytes_per_sec     # header bytes included; close enough for a counter
+    while True:
+        start_ts = time.strftime("%H:%M:%S", time.gmtime())
+        filename = f"{listener_id}_{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}.wav"
+        parts, headers = body.render(listener_id, filename)
+        post_start = time.monotonic()
+        st.connected = True
+        try:
+            async with session.post(endpoint, data=iter_parts(parts), headers=headers) as resp:
+                await resp.read()
+            st.upload_lat.record(time.monotonic() - post_start)
+            dashboard_hist.appendleft((listener_id, fmt_status(resp.status), start_ts))
+            if resp.status >= 400:
+                st.error(f"HTTP {resp.status}")
+            else:
+                st.files += 1
+                st.file_page = 1
+                st.bytes += len(body.wav)
+                st.seconds += audio_s
+        except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+            st.error(type(e).__name__)
+            dashboard_hist.appendleft(
+                (listener_id, Text(f"ERROR: {type(e).__name__}", style="red"), start_ts))
+        finally:
+            st.connected = False
+        await asyncio.sleep(interval_wait(interval_s, jitter_s))
+
+
+def sync_progress(progress: Progress, task_ids: dict[str, int], seen_file: dict[str, int]):
+    """Derive every progress bar from the raw counters (once per render, not per page)."""
+    for lid, tid in task_ids.items():
+        st = stats[lid]
+        if seen_file.get(lid) != st.file_no:
+            # new file (or restart after reconnect) → restart bar and elapsed timer
+            seen_file[lid] = st.file_no
+            progress.reset(tid, total=st.file_pages, completed=st.file_page)
+        progress.update(tid, completed=st.file_page, files=st.files,
+                        time=fmt_hms(st.seconds), lag=fmt_lag(st.lag))
+
+
+def latency_text() -> Text:
+    sts = list(stats.values())
+    text = Text.assemble(
+        ("Frame write: ", "bold"), (fmt_percentiles(merged(st.frame_lat for st in sts)), "cyan"),
+        ("\nConnect:     ", "bold"), (fmt_percentiles(merged(st.connect_lat for st in sts)), "cyan"),
+    )
+    reconnects = merged(st.reconnect_lat for st in sts)
+    if reconnects.count:
+        text.append_text(Text.assemble(
+            ("\nReconnect:   ", "bold"), (fmt_percentiles(reconnects), "cyan"),
+            ("\nRecovery:    ", "bold"), (fmt_percentiles(recovery.hist), "cyan")))
+    resumes = sum(st.resumes for st in sts)
+    if resumes:
+        avoided = sum(st.bytes_avoided for st in sts)
+        text.append_text(Text.assemble(("\nResumed:     ", "bold"),
+                                       (f"{resumes} reconnects, {avoided / 1e6:,.1f} MB not re-sent",
+                                        "cyan")))
+    return text
+
+
+async def dashboard_updater(history: deque, progress: Progress, task_ids: dict[str, int]):
+    seen_file: dict[str, int] = {}
     with Live(refresh_per_second=4, vertical_overflow="visible") as live:
         while True:
+            sync_progress(progress, task_ids, seen_file)
             tbl = Table(show_header=True, header_style="bold magenta",
                         row_styles=["none", "dim"])
             tbl.add_column("Listener",  width=12)
@@ -189,74 +760,449 @@ async def dashboard_updater(history: deque, progress: Progress):
             tbl.add_column("Time UTC",  width=10)
             for lid, status_text, ts in history:
                 tbl.add_row(lid, status_text, ts)
-            live.update(Group(progress, tbl))
+            live.update(Group(progress, latency_text(), tbl))
             await asyncio.sleep(0.25)
 
 
-async def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("-f", "--file", default="sample.wav",
-                    help="WAV file to loop‑stream")
-    ap.add_argument("-n", "--num-sources", type=int, default=1,
-                    help="Number of concurrent listeners")
-    ap.add_argument("-i", "--interval", type=float, default=20.0,
-                    help="Seconds to wait after each full file before restarting seq=0")
-    ap.add_argument("-s", "--stagger", type=float, default=5.0,
-                    help="Random start offset per listener")
-    ap.add_argument("-u", "--url", default="http://localhost:8000/stream")
-    args = ap.parse_args()
+def totals_snapshot() -> dict:
+    """Run-wide sums of the listener counters plus merged latency histograms."""
+    sts = list(stats.values())
+    return {
+        "frames": sum(st.pages + st.file_no for st in sts),    # PCM pages + header frames
+        "bytes": sum(st.bytes for st in sts),
+        "audio_s": sum(st.seconds for st in sts),
+        "files": sum(st.files for st in sts),
+        "errors": sum(st.errors for st in sts),
+        "resumes": sum(st.resumes for st in sts),
+        "bytes_avoided": sum(st.bytes_avoided for st in sts),
+        "reconnects": sum(st.reconnects for st in sts),
+        "throttled": sum(st.throttled for st in sts),
+        "connected": sum(st.connected for st in sts),
+        "lag": max((st.lag for st in sts), default=0.0),
+        "lag_max": max((st.lag_max for st in sts), default=0.0),
+        "frame_lat": merged(st.frame_lat for st in sts),
+        "connect_lat": merged(st.connect_lat for st in sts),
+        "lag_hist": merged(st.lag_hist for st in sts),
+        "reconnect_lat": merged(st.reconnect_lat for st in sts),
+        "recovery": recovery.hist.copy(),
+    }
 
-    wav_path = Path(args.file)
-    if not wav_path.exists():
-        sys.exit(f"WAV not found: {wav_path}")
 
-    wav_bytes = wav_path.read_bytes()
-    full_header, pcm = split_wav(wav_bytes)
+async def recovery_updater():
+    while True:
+        await asyncio.sleep(REPORT_EVERY)
+        recovery.update(stats)
 
-    # pacing derived from the fmt chunk (via wave module)
-    with wave.open(str(wav_path), "rb") as wf:
-        rate, chans, width = wf.getframerate(), wf.getnchannels(), wf.getsampwidth()
-    bytes_per_sec = rate * chans * width
-    page_dur = PAGE / bytes_per_sec
 
-    progress = Progress(
+async def metrics_updater(writer: MetricsWriter, interval: float, active, h2: bool = False):
+    """
+    Write one aggregate row every `interval` seconds, derived from the raw
+    counters; with `h2`, also the HTTP/2 connection counts.
+    """
+    started = prev_t = time.monotonic()
+    prev = totals_snapshot()
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        cur = totals_snapshot()
+        writer.write({
+            "ts": round(time.time(), 3),
+            "elapsed_s": round(now - started, 3),
+            "listeners": active.value,
+            "connected": cur["connected"],
+            "frames": cur["frames"],
+            "frames_per_s": rate(cur["frames"], prev["frames"], now - prev_t),
+            "bytes": cur["bytes"],
+            "bytes_per_s": rate(cur["bytes"], prev["bytes"], now - prev_t),
+            "audio_s": round(cur["audio_s"], 3),
+            "files": cur["files"],
+            "errors": cur["errors"],
+            "resumes": cur["resumes"],
+            "bytes_avoided": cur["bytes_avoided"],
+            "reconnects": cur["reconnects"],
+            "throttled_s": round(cur["throttled"], 3),
+            "lag_ms": round(cur["lag"] * 1000, 1),
+            "lag_max_ms": round(cur["lag_max"] * 1000, 1),
+            **(h2_fields(cur["connected"]) if h2 else {}),
+            # latency percentiles over this interval only
+            **cur["frame_lat"].since(prev["frame_lat"]).summary("frame_"),
+            **cur["connect_lat"].since(prev["connect_lat"]).summary("connect_"),
+            **cur["reconnect_lat"].since(prev["reconnect_lat"]).summary("reconnect_"),
+            # whole run: storms are rare, so per-interval numbers would mostly be empty
+            **cur["recovery"].summary("recovery_"),
+        })
+        prev_t, prev = now, cur
+
+
+def measure_step(before: dict, after: dict, seconds: float, n: int) -> dict:
+    """One ramp-step row: throughput, real-time ratio, error rate and latency."""
+    audio = after["audio_s"] - before["audio_s"]
+    return {
+        "frames_per_s": rate(after["frames"], before["frames"], seconds),
+        "bytes_per_s": rate(after["bytes"], before["bytes"], seconds),
+        # 1.0 ⇔ every listener delivered real-time audio for the whole step
+        "rt_ratio": round(audio / (seconds * n), 3) if seconds and n else 0.0,
+        # connection errors per active listener during the step
+        "error_pct": round((after["errors"] - before["errors"]) / n * 100, 2) if n else 0.0,
+        "p99_ms": round(after["frame_lat"].since(before["frame_lat"]).percentile(99) * 1000, 2),
+        "lag_p99_ms": round(after["lag_hist"].since(before["lag_hist"]).percentile(99) * 1000, 2),
+    }
+
+
+def final_report(args: argparse.Namespace, specs: list[ListenerSpec], started: float,
+                 elapsed: float, steps: list[dict]) -> dict:
+    """End-of-run report (see report.py) from the raw counters."""
+    now = time.monotonic()
+    listeners, errors = {}, {}
+    audio = target_audio = 0.0
+    for spec in specs:
+        st = stats[spec.lid]
+        for kind, n in st.error_kinds.items():
+            errors[kind] = errors.get(kind, 0) + n
+        if spec.mode == "upload":
+            due = st.target_s(now) / spec.interval if spec.interval > 0 else 0.0
+            rt = ratio(st.files, due)
+        else:
+            rt = ratio(st.seconds, st.target_s(now))
+            audio += st.seconds
+            target_audio += st.target_s(now)
+        listeners[spec.lid] = {
+            "mode": spec.mode, "files": st.files, "bytes": st.bytes,
+            "audio_s": round(st.seconds, 3), "rt_ratio": rt, "errors": st.errors,
+            "reconnects": st.reconnects, "resumes": st.resumes,
+            "lag_max_ms": round(st.lag_max * 1000, 1),
+            "frame_p99_ms": round(st.frame_lat.percentile(99) * 1000, 3),
+        }
+    t = totals_snapshot()
+    totals = {
+        "listeners": len(specs), "frames": t["frames"], "bytes": t["bytes"],
+        "bytes_per_s": rate(t["bytes"], 0, elapsed), "audio_s": round(t["audio_s"], 3),
+        "files": t["files"], "rt_ratio": ratio(audio, target_audio), "errors": t["errors"],
+        "reconnects": t["reconnects"], "resumes": t["resumes"],
+        "bytes_avoided": t["bytes_avoided"], "throttled_s": round(t["throttled"], 3),
+    }
+    if args.transport == "h2":
+        # per connection at the peak: by now the connections may be torn down
+        opened, _, peak = h2_counts()
+        totals["h2_conns_opened"] = opened
+        totals["h2_conns_peak"] = peak
+        totals["listeners_per_h2_conn"] = round(len(specs) / peak, 1) if peak else None
+    latency = {"frame": t["frame_lat"], "connect": t["connect_lat"], "lag": t["lag_hist"],
+               "post": merged(st.upload_lat for st in stats.values()),
+               "reconnect": t["reconnect_lat"], "recovery": t["recovery"]}
+    return build_report("stress_test_stream", args, started, elapsed, totals, errors, latency,
+                        listeners, steps)
+
+
+def make_progress() -> Progress:
+    return Progress(
         "[progress.description]{task.fields[lid]}"
         "| n {task.fields[files]:>3} "
-        "| ⏱ {task.fields[time]} ",
+        "| ⏱ {task.fields[time]} "
+        "| lag {task.fields[lag]} ",
         BarColumn(None),
         TaskProgressColumn(),
         TimeElapsedColumn(),
     )
-    hist = deque(maxlen=20)  # Increased to show more history including errors
-    # ───── register tasks per listener ─────────────────────────────────
+
+
+def register_stats(lids: list[str]):
+    for lid in lids:
+        stats[lid] = ListenerStats()
+
+
+def register_listeners(progress: Progress, lids: list[str]) -> dict[str, int]:
+    """Reset the global counters and add one progress task per listener."""
+    register_stats(lids)
     task_ids = {}
-    for lid in (f"listener{idx:02d}" for idx in range(1, args.num_sources + 1)):
-        files_sent[lid]   = 0
-        seconds_sent[lid] = 0.0
+    for lid in lids:
         task_ids[lid] = progress.add_task(
             "", lid=lid,
-            files=0, time="00:00",
+            files=0, time="00:00", lag=fmt_lag(0.0),
             total=1
         )
+    return task_ids
+
+
+def add_transport_args(ap: argparse.ArgumentParser):
+    ap.add_argument("-t", "--transport", choices=("aiohttp", "raw", "h2"), default="aiohttp",
+                    help="HTTP client: aiohttp, a lightweight chunked writer on asyncio streams, "
+                         "or HTTP/2 with listeners multiplexed over shared connections")
+    ap.add_argument("--h2-max-streams", type=int, default=100,
+                    help="With --transport h2: listener streams per connection "
+                         "(the server's SETTINGS_MAX_CONCURRENT_STREAMS still applies)")
+
 
+def make_session(transport: str = "aiohttp",
+                 h2_max_streams: int = 100) -> aiohttp.ClientSession | RawSession | H2Session:
+    if transport == "raw":
+        return RawSession()
+    if transport == "h2":
+        return H2Session(h2_max_streams)
     timeout = aiohttp.ClientTimeout(total=None)
-    async with aiohttp.ClientSession(timeout=timeout, connector=aiohttp.TCPConnector(limit=None)) as session:
-        stream_tasks = [
-            asyncio.create_task(
-                streamer(lid, full_header, pcm, page_dur, args.interval, args.stagger,
-                         args.url, bytes_per_sec, progress, task_ids[lid], hist, session)
+    return aiohttp.ClientSession(timeout=timeout, connector=aiohttp.TCPConnector(limit=None))
+
+
+# ───────────────────────── multi-process shards ──────────────────────────────
+async def shard_reporter(lids: list[str], hist: deque, out_q: mp.Queue):
+    """Worker side: ship per-listener counters, new latency samples and history rows to the parent."""
+    while True:
+        await asyncio.sleep(REPORT_EVERY)
+        # taken now – the queue pickles in a feeder thread while streamers keep counting
+        snapshot = {lid: stats[lid].take_report() for lid in lids}
+        events = list(hist)        # newest first
+        hist.clear()
+        out_q.put((mp.current_process().name, snapshot, events, h2_counts()))
+
+
+async def spawn_listeners(shard: list[tuple[int, ListenerSpec]], active, start: Callable):
+    """
+    Start each listener of this shard once its global index falls below
+    `active.value` (all at once normally, step by step during a ramp).
+    """
+    pending = list(shard)
+    tasks = []
+    while pending:
+        n = active.value
+        while pending and pending[0][0] < n:
+            tasks.append(start(*pending.pop(0)))
+        if pending:
+            await asyncio.sleep(REPORT_EVERY)
+    await asyncio.gather(*tasks)
+
+
+async def run_shard(shard: list[tuple[int, ListenerSpec]], args: argparse.Namespace, active,
+                    sweep_page, hist: deque, *side_jobs):
+    """Run every listener of `shard` from this event loop, alongside `side_jobs`."""
+    sources: dict[Path | Synth, WavSource] = {}    # mapped/rendered on first use, shared
+    bodies: dict[Path | Synth, UploadBody] = {}
+    pacer = Pacer()
+    limiter = None
+    if args.reconnect_rate:
+        # the global budget, split evenly across worker processes
+        limiter = TokenBucket(args.reconnect_rate / args.workers, args.reconnect_burst / args.workers)
+
+    # uploads (multipart) and resume queries (GET) need aiohttp whatever --transport streams use
+    async with make_session(args.transport, args.h2_max_streams) as session, \
+               make_session() as upload_session:
+        if isinstance(session, H2Session):
+            h2_sessions.append(session)
+        def start(idx: int, spec: ListenerSpec) -> asyncio.Task:
+            if spec.source not in sources:
+                sources[spec.source] = WavSource(spec.source, with_crc=bool(args.meta_every))
+            source = sources[spec.source]
+            if spec.mode == "upload":
+                if spec.source not in bodies:
+                    bodies[spec.source] = UploadBody(source.data)
+                return asyncio.create_task(
+                    uploader(spec.lid, bodies[spec.source], source.bytes_per_sec, spec.interval,
+                             spec.stagger, spec.jitter, spec.url, hist, upload_session)
+                )
+            if args.page_sweep:
+                size = lambda: sweep_page.value
+            else:
+                size = lambda: spec.page_size
+            return asyncio.create_task(
+                streamer(spec.lid, source, size, spec.interval, spec.stagger, spec.jitter,
+                         spec.url, hist, session, pacer, args.meta_every,
+                         spec.max_delay, spec.max_attempts, args.resume, upload_session,
+                         args.backoff, limiter)
             )
-            for lid in task_ids
-        ]
-        ui_task = asyncio.create_task(dashboard_updater(hist, progress))
+        await asyncio.gather(spawn_listeners(shard, active, start), pacer.run(), *side_jobs)
+
+
+async def worker_main(shard: list[tuple[int, ListenerSpec]], args: argparse.Namespace, active,
+                      sweep_page, out_q: mp.Queue):
+    hist = deque(maxlen=HIST_LEN)
+    lids = [spec.lid for _, spec in shard]
+    register_stats(lids)
+    await run_shard(shard, args, active, sweep_page, hist, shard_reporter(lids, hist, out_q))
+
+
+def run_worker(shard: list[tuple[int, ListenerSpec]], args: argparse.Namespace, active,
+               sweep_page, out_q: mp.Queue):
+    """Process entry point for one shard of listeners."""
+    try:
+        run(worker_main(shard, args, active, sweep_page, out_q), args.loop)
+    except KeyboardInterrupt:
+        pass
+
 
+async def shard_collector(out_q: mp.Queue, hist: deque):
+    """Parent side: merge worker snapshots into the global counters and dashboard."""
+    loop = asyncio.get_running_loop()
+    while True:
         try:
-            await asyncio.gather(*stream_tasks, ui_task)
-        except asyncio.CancelledError:
-            pass
+            name, snapshot, events, h2 = await loop.run_in_executor(None, out_q.get, True, 1.0)
+        except queue.Empty:
+            continue
+        h2_shards[name] = h2
+        for lid, report in snapshot.items():
+            stats[lid].apply_report(*report)
+        for event in reversed(events):
+            hist.appendleft(event)
+
+
+async def shard_watchdog(workers: list[mp.Process], dead: list[mp.Process], run_task: asyncio.Task):
+    """Parent side: stop the run if a worker dies, instead of reporting its listeners as idle."""
+    while True:
+        await asyncio.sleep(REPORT_EVERY)
+        # 0 is a worker leaving on Ctrl-C, which stops the parent as well
+        dead[:] = [proc for proc in workers if proc.exitcode not in (None, 0)]
+        if dead:
+            for proc in dead:
+                print(f"\n{proc.name} exited with code {proc.exitcode}; stopping the run",
+                      file=sys.stderr)
+            run_task.cancel()
+            return
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-f", "--file", default="sample.wav",
+                    help="WAV file to loop‑stream")
+    ap.add_argument("-n", "--num-sources", type=int, default=1,
+                    help="Number of concurrent listeners")
+    ap.add_argument("-i", "--interval", type=float, default=20.0,
+                    help="Seconds to wait after each full file before restarting seq=0")
+    ap.add_argument("-s", "--stagger", type=float, default=5.0,
+                    help="Random start offset per listener")
+    ap.add_argument("--jitter", type=float, default=0.0,
+                    help="Vary every --interval wait randomly by up to ± this many seconds")
+    ap.add_argument("-u", "--url", default="http://localhost:8000/stream")
+    ap.add_argument("--scenario", default=None,
+                    help="YAML/JSON file of listener groups (overrides --num-sources; "
+                         "other flags are the defaults for keys a group leaves out)")
+    ap.add_argument("-c", "--corpus", default=None,
+                    help="Directory of WAV files to spread across listeners (overrides --file)")
+    ap.add_argument("--synth", default=None, metavar="SPEC",
+                    help="Stream generated audio instead of a file, e.g. tone:freq=440,duration=20 "
+                         "(see synth.py; overrides --file and --corpus)")
+    ap.add_argument("--assign", choices=("round-robin", "random"), default="round-robin",
+                    help="How corpus files are assigned to listeners")
+    ap.add_argument("--seed", type=int, default=0,
+                    help="Seed for --assign random")
+    ap.add_argument("-m", "--meta-every", type=int, default=0,
+                    help="Send a metadata frame (send time, counters) every N pages, "
+                         "plus a CRC-32 frame after each file (0 = off)")
+    add_transport_args(ap)
+    ap.add_argument("--resume", choices=("off", "local", "server"), default="off",
+                    help="After a reconnect, continue the interrupted file instead of restarting it: "
+                         "after the last page sent (local) or the last page the server "
+                         "reports holding (server)")
+    ap.add_argument("--backoff", choices=("fixed", "full", "decorrelated"), default="full",
+                    help="Reconnect backoff: fixed doubling (listeners retry in lockstep), "
+                         "full jitter, or decorrelated jitter")
+    ap.add_argument("--reconnect-rate", type=float, default=0.0,
+                    help="Cap on reconnect attempts per second across all listeners (0 = no cap)")
+    ap.add_argument("--reconnect-burst", type=float, default=10.0,
+                    help="Reconnects allowed back to back before --reconnect-rate applies")
+    ap.add_argument("-p", "--page-size", type=page_sizes, default=[PAGE],
+                    help="PCM bytes per frame; a comma list (e.g. 4096,32768) assigns "
+                         "sizes to listeners round-robin")
+    ap.add_argument("--page-sweep", type=page_sizes, default=None,
+                    help="Sweep mode: run every listener at each of these page sizes "
+                         "(comma list) for --ramp-settle + --ramp-hold and report per size")
+    ap.add_argument("-w", "--workers", type=int, default=1,
+                    help="Shard listeners across this many processes (1 = single event loop)")
+    add_loop_args(ap)
+    add_metrics_args(ap)
+    add_ramp_args(ap)
+    add_report_args(ap)
+    ap.add_argument("--slo-lag-ms", type=float, default=None,
+                    help="Ramp: stop when p99 page release lag exceeds this")
+    args = ap.parse_args()
+
+    try:
+        specs = build_specs(args)
+    except (ValueError, OSError, wave.Error) as e:
+        sys.exit(str(e))
+    args.num_sources = len(specs)
+    if args.workers < 1:
+        sys.exit("--workers must be >= 1")
+    if args.page_sweep and args.ramp_step:
+        sys.exit("--page-sweep and --ramp-step can't be combined")
+
+    started_wall, started = time.time(), time.monotonic()
+    hist = deque(maxlen=HIST_LEN)  # Increased to show more history including errors
+    # ───── register tasks per listener ─────────────────────────────────
+    lids = [spec.lid for spec in specs]
+    # listeners with a global index below `active` are started (grows during a ramp)
+    active = mp.Value("i", 0 if args.ramp_step else args.num_sources)
+    # page size during a sweep; read on every page, so unlocked (a torn read is impossible for an int)
+    sweep_page = mp.Value("i", args.page_sweep[0] if args.page_sweep else 0, lock=False)
+    ui_jobs = [recovery_updater()]
+    if args.headless:
+        register_stats(lids)
+    else:
+        progress = make_progress()
+        task_ids = register_listeners(progress, lids)
+        ui_jobs.append(dashboard_updater(hist, progress, task_ids))
+    writer = open_metrics(args)
+    if writer:
+        ui_jobs.append(metrics_updater(writer, args.metrics_interval, active,
+                                       h2=args.transport == "h2"))
+
+    shards = [list(enumerate(specs))[w::args.workers] for w in range(args.workers)]
+    workers, dead = [], []
+    if args.workers > 1:
+        out_q = mp.Queue()
+        workers = [
+            mp.Process(target=run_worker, args=(shard, args, active, sweep_page, out_q),
+                       name=f"shard{w}", daemon=True)
+            for w, shard in enumerate(shards)
+            if shard
+        ]
+        for proc in workers:
+            proc.start()
+        background = [asyncio.create_task(shard_collector(out_q, hist)),
+                      asyncio.create_task(shard_watchdog(workers, dead, asyncio.current_task()))]
+        background += [asyncio.create_task(job) for job in ui_jobs]
+    else:
+        background = [asyncio.create_task(run_shard(shards[0], args, active, sweep_page, hist,
+                                                    *ui_jobs))]
+
+    results = []
+    try:
+        if args.ramp_step:
+            def set_active(n: int):
+                active.value = n
+            results = await run_ramp(
+                args.num_sources, args.ramp_step, args.ramp_hold, args.ramp_settle,
+                set_active, totals_snapshot, measure_step,
+                {"p99_ms": args.slo_p99_ms, "error_pct": args.slo_error_pct,
+                 "lag_p99_ms": args.slo_lag_ms},
+                on_step=writer.write_step if writer else None)
+        elif args.page_sweep:
+            def set_page(size: int):
+                sweep_page.value = size
+            results = await run_sweep(
+                "page_size", args.page_sweep, args.ramp_hold, args.ramp_settle,
+                set_page, totals_snapshot, measure_step, args.num_sources,
+                on_step=writer.write_step if writer else None)
+        else:
+            await asyncio.gather(*background)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        for proc in workers:
+            proc.terminate()
+        if writer:
+            writer.close()
+    save_report(final_report(args, specs, started_wall, time.monotonic() - started, results), args)
+    if args.page_sweep:
+        print_sweep_report(results, "page_size", plain=args.headless)
+    else:
+        print_ramp_report(results, plain=args.headless)
+    if dead:
+        sys.exit(f"run stopped early: {', '.join(proc.name for proc in dead)} exited "
+                 "(the report covers the time before)")
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run(main(), loop_from_argv())
     except KeyboardInterrupt:
-        print("\nStopped by user")
\ No newline at end of file
+        print("\nStopped by user")
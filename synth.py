@@ -0,0 +1,167 @@
+"""
+Synthetic WAV audio, so load runs need no recording on disk.
+
+A source is written as `KIND[:key=value,…]`, e.g.
+
+    tone:freq=1000,rate=48000,channels=2,duration=600
+    chirp:f0=100,f1=8000,sweep=2
+    noise:seed=7,width=3
+    silence:duration=3600
+
+Kinds: silence, tone (sine at `freq`), noise (uniform white noise from
+`seed`), chirp (linear sweep from `f0` to `f1` every `sweep` seconds).
+Common keys: rate, channels, width (bytes per sample: 1-4), duration
+(seconds), amp (0-1, tone/chirp). The whole file (header + PCM) is rendered
+once into one bytearray that every listener in the process shares. Memory is
+duration × rate × channels × width.
+
+Signals are periodic (1 s for tones with an integer frequency, `sweep` for
+chirps), so only one period is computed and then tiled. The period is
+vectorized with NumPy when it is installed, and computed in pure Python
+otherwise. Output is deterministic, so per-file checksums repeat across
+runs.
+
+Run as a script to write a synthetic file:
+
+    python synth.py tone:freq=440,duration=20 sample.wav
+"""
+import argparse, math, random, struct, sys
+from collections import namedtuple
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+KINDS = ("silence", "tone", "noise", "chirp")
+_INT_KEYS = {"rate", "channels", "width", "seed"}
+
+
+class Synth(namedtuple("Synth", "kind rate channels width duration freq f0 f1 sweep amp seed",
+                       defaults=(44_100, 1, 2, 10.0, 440.0, 100.0, 8_000.0, 1.0, 0.5, 0))):
+    """A synthetic source; hashable and picklable, so it can key caches and cross to workers."""
+    __slots__ = ()
+
+    @property
+    def bytes_per_sec(self) -> int:
+        return self.rate * self.channels * self.width
+
+    def data_bytes(self) -> int:
+        return int(self.duration * self.rate) * self.channels * self.width
+
+
+def parse_spec(text: str) -> Synth:
+    """`KIND[:key=value,…]` → Synth; raises ValueError on anything invalid."""
+    kind, _, params = text.partition(":")
+    if kind not in KINDS:
+        raise ValueError(f"unknown synth kind {kind!r} (choose from {', '.join(KINDS)})")
+    values = {}
+    for item in filter(None, params.split(",")):
+        key, sep, value = item.partition("=")
+        key = key.strip()
+        if not sep or key not in Synth._fields or key == "kind":
+            raise ValueError(f"bad synth parameter {item!r}")
+        try:
+            values[key] = int(value) if key in _INT_KEYS else float(value)
+        except ValueError:
+            raise ValueError(f"bad value for {key}: {value!r}") from None
+    spec = Synth(kind, **values)
+    if not 1 <= spec.width <= 4:
+        raise ValueError("width must be 1-4 bytes")
+    if spec.rate < 1 or spec.channels < 1 or spec.duration <= 0 or spec.sweep <= 0:
+        raise ValueError("rate, channels, duration and sweep must be positive")
+    if not 0 <= spec.amp <= 1:
+        raise ValueError("amp must be 0-1 (full scale)")
+    if spec.data_bytes() > 0xFFFFFFFF - 36:
+        raise ValueError("too long for a WAV file (4 GiB data limit)")
+    return spec
+
+
+def wav_header(rate: int, channels: int, width: int, data_bytes: int) -> bytes:
+    """44-byte canonical PCM WAV header."""
+    block = channels * width
+    return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + data_bytes, b"WAVE",
+                       b"fmt ", 16, 1, channels, rate, rate * block, block, width * 8,
+                       b"data", data_bytes)
+
+
+def _period(spec: Synth) -> int:
+    """Samples after which the signal repeats (the whole file if it doesn't)."""
+    total = int(spec.duration * spec.rate)
+    if spec.kind == "chirp":
+        return min(total, max(1, round(spec.sweep * spec.rate)))
+    if spec.kind == "tone" and float(spec.freq).is_integer():
+        return min(total, spec.rate)
+    return total
+
+
+def _phase(spec: Synth, i: int) -> float:
+    t = i / spec.rate
+    if spec.kind == "tone":
+        return 2 * math.pi * spec.freq * t
+    k = (spec.f1 - spec.f0) / spec.sweep         # chirp: linear sweep within one period
+    return 2 * math.pi * (spec.f0 * t + k * t * t / 2)
+
+
+def _quantize_py(spec: Synth, n: int) -> bytes:
+    full = (1 << (8 * spec.width - 1)) - 1
+    out = bytearray()
+    for i in range(n):
+        v = round(spec.amp * math.sin(_phase(spec, i)) * full)
+        if spec.width == 1:
+            sample = bytes((v + 128,))                      # 8-bit WAV is unsigned
+        else:
+            sample = v.to_bytes(spec.width, "little", signed=True)
+        out += sample * spec.channels
+    return bytes(out)
+
+
+def _quantize_np(spec: Synth, n: int) -> bytes:
+    t = np.arange(n) / spec.rate
+    if spec.kind == "tone":
+        phase = 2 * np.pi * spec.freq * t
+    else:
+        phase = 2 * np.pi * (spec.f0 * t + (spec.f1 - spec.f0) / spec.sweep * t * t / 2)
+    full = (1 << (8 * spec.width - 1)) - 1
+    v = np.rint(spec.amp * np.sin(phase) * full).astype(np.int64)
+    if spec.width == 1:
+        v += 128
+    # little-endian bytes of each sample, lowest `width` of them, repeated per channel
+    samples = v.astype("<i8").view(np.uint8).reshape(n, 8)[:, :spec.width]
+    return np.repeat(samples[:, None, :], spec.channels, axis=1).tobytes()
+
+
+def render(spec: Synth) -> bytearray:
+    """The complete WAV file (header + PCM) in one buffer."""
+    data_bytes = spec.data_bytes()
+    header = wav_header(spec.rate, spec.channels, spec.width, data_bytes)
+    buf = bytearray(len(header) + data_bytes)
+    buf[:len(header)] = header
+    pcm = memoryview(buf)[len(header):]
+    if spec.kind == "noise":
+        pcm[:] = random.Random(spec.seed).randbytes(data_bytes)
+    elif spec.kind in ("tone", "chirp"):
+        block = (_quantize_np if np is not None else _quantize_py)(spec, _period(spec))
+        for off in range(0, data_bytes, len(block)):
+            chunk = block[:data_bytes - off]
+            pcm[off:off + len(chunk)] = chunk
+    elif spec.width == 1:
+        pcm[:] = b"\x80" * data_bytes           # unsigned 8-bit silence is the midpoint
+    return buf
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Write a synthetic WAV file.")
+    ap.add_argument("spec", help="KIND[:key=value,…], e.g. tone:freq=440,duration=20")
+    ap.add_argument("out", help="Output .wav path")
+    args = ap.parse_args()
+    try:
+        spec = parse_spec(args.spec)
+    except ValueError as e:
+        sys.exit(str(e))
+    Path(args.out).write_bytes(render(spec))
+
+
+if __name__ == "__main__":
+    main()